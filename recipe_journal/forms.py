@@ -3,9 +3,47 @@ Module containing various forms used for filtering, displaying, and manipulating
 
 Each form in this module serves as a structured input interface for interacting with the application's data models and views.
 """
-from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import NON_FIELD_ERRORS
 from django import forms
-from recipe_journal.models import Ingredient, Member, Recipe, RecipeCollectionEntry, RecipeIngredient
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Exists, OuterRef
+from django.db.models.functions import Cast
+from recipe_journal.models import DuplicateCollectionEntryError, Ingredient, Member, Recipe, RecipeCollectionEntry
+from recipe_journal.models import RecipeIngredient
+from types import MappingProxyType
+
+def save_with_unique_check(instance, form, field, message):
+    """
+    Saves a model instance, reporting a unique constraint violation as a form error.
+
+    Parameters:
+    - instance (Model): The instance to save.
+    - form (Form): The form the error is added to.
+    - field (str or None): The field the error relates to, or None for a non-field error.
+    - message (str): The error message.
+
+    Raises:
+    - ValidationError: If the instance conflicts on the field with a row saved after the form was validated.
+    - IntegrityError: If the save failed for another reason, e.g. a NOT NULL constraint.
+    """
+    try:
+        with transaction.atomic():
+            instance.save()
+    except IntegrityError:
+        # The database error doesn't tell which constraint failed, so the model checks are run again.
+        errors = {}
+        for validate in (instance.validate_unique, instance.validate_constraints):
+            try:
+                validate()
+            except forms.ValidationError as e:
+                errors = e.update_error_dict(errors)
+        if (field or NON_FIELD_ERRORS) not in errors:
+            raise
+
+        error = forms.ValidationError(message, code="unique")
+        form.add_error(field, error)
+        raise error
 
 class LoginForm(forms.Form):
     """Form to handle user login by capturing and validating the username and password."""
@@ -13,23 +51,42 @@ class LoginForm(forms.Form):
     username = forms.CharField(label="identifiant", required=True)
     password = forms.CharField(label="mot de passe", widget = forms.PasswordInput, required=True)
 
+    def __init__(self, *args, **kwargs):
+        """Initializes the form with an empty cache for the authenticated user."""
+
+        self.user_cache = None
+        super().__init__(*args, **kwargs)
+
     def clean(self):
-        """Validates that the username and password match an existing user."""
+        """
+        Validates that the username and password match an existing user.
 
+        Only the columns needed to authenticate are fetched, and the matching user is kept
+        so the view does not have to query it again.
+        """
         cleaned_data = super().clean()
         username = cleaned_data.get("username")
         password = cleaned_data.get("password")
 
         if username and password:
             try:
-                user = Member.objects.get(username=username)
+                user = Member.objects.only("id", "password").get(username=username)
             except Member.DoesNotExist:
+                # Hash the submitted password anyway so that an unknown username takes
+                # as long to reject as a wrong password.
+                make_password(password)
                 raise forms.ValidationError("Identifiant ou mot de passe erroné.")
 
-            if not check_password(password, user.password):
+            if not user.check_password(password):
                 raise forms.ValidationError("Identifiant ou mot de passe erroné.")
+            self.user_cache = user
         return cleaned_data
 
+    def get_user(self):
+        """Returns the user authenticated during validation, or None if the form is invalid."""
+
+        return self.user_cache
+
 class RegistrationForm(forms.ModelForm):
     """Form to handle user registration, ensuring the provided username is unique."""
 
@@ -41,20 +98,18 @@ class RegistrationForm(forms.ModelForm):
             "password": "mot de passe",
         }
         widgets = {"password": forms.PasswordInput()}
-
-    def clean_username(self):
-        """Ensures the username is unique and not already taken by another user."""
-
-        username = self.cleaned_data.get("username")
-
-        if username:
-            if Member.objects.filter(username=username).exists():
-                raise forms.ValidationError("Identifiant non disponible.")
-        return username
+        # Username uniqueness is checked once by the model's unique constraint during validation.
+        error_messages = {
+            "username": {"unique": "Identifiant non disponible."},
+        }
     
     def save(self, commit=True):
-        """Saves the new user after hashing the password."""
+        """
+        Saves the new user after hashing the password.
 
+        Raises:
+        - ValidationError: If the username was taken after the form was validated.
+        """
         member = super().save(commit=False)
         password = self.cleaned_data["password"]
 
@@ -62,7 +117,7 @@ class RegistrationForm(forms.ModelForm):
             member.password = make_password(password)
 
         if commit:
-            member.save()
+            save_with_unique_check(member, self, "username", "Identifiant non disponible.")
 
         return member
     
@@ -99,26 +154,20 @@ class ModifyProfileForm(forms.ModelForm):
 
         Parameters:
         - logged_user (Member): The currently logged-in user attempting to modify their profile.
+          Used as the form instance if none is given, so that keeping the same username passes
+          the uniqueness check.
         """
         self.logged_user = logged_user
+        if logged_user is not None:
+            kwargs.setdefault("instance", logged_user)
         super().__init__(*args, **kwargs)
 
-    def clean_username(self):
-        """Validates that the username is either unchanged or unique."""
-
-        username = self.cleaned_data.get("username")
-
-        if username and username != self.logged_user.username:
-            if Member.objects.filter(username=username).exists():
-                raise forms.ValidationError("Identifiant non disponible.")
-        return username
-
     def clean_former_password(self):
         """Validates that the former password matches the stored password."""
 
         former_password = self.cleaned_data.get("former_password")
 
-        if not check_password(former_password, self.logged_user.password):
+        if not self.logged_user.check_password(former_password):
             raise forms.ValidationError("Ancien mot de passe erroné.")
         return former_password
     
@@ -135,8 +184,12 @@ class ModifyProfileForm(forms.ModelForm):
 
     
     def save(self, commit=True):
-        """Saves the modified profile with the new username and password."""
+        """
+        Saves the modified profile with the new username and password.
 
+        Raises:
+        - ValidationError: If the new username was taken after the form was validated.
+        """
         username = self.cleaned_data["username"]
         new_password = self.cleaned_data["new_password"]
 
@@ -147,7 +200,7 @@ class ModifyProfileForm(forms.ModelForm):
             member.password = make_password(new_password)
 
         if commit:
-            member.save()
+            save_with_unique_check(member, self, "username", "Identifiant non disponible.")
 
         return member
 
@@ -179,17 +232,11 @@ class RecipeMainSubForm(forms.ModelForm):
             "url_link": forms.URLInput(attrs={"placeholder": "Lien vers la recette"}),
             "content": forms.Textarea(attrs={"placeholder": "Écrire ou copier/coller les étapes de la recette ici ..."}),
         }
-
-    def clean_title(self):
-        """Checks that the recipe title is unique and not already in use."""
-
-        title = self.cleaned_data.get("title")
-
-        if title:
-            if Recipe.objects.filter(title=title).exists():
-                raise forms.ValidationError("Titre déjà utilisé.")
-            
-        return title
+        # Title uniqueness, regardless of case, is checked once by the model's
+        # validate_constraints() against its case-folded title.
+        error_messages = {
+            "title": {"duplicate_title": "Titre déjà utilisé."},
+        }
 
 class RecipeSecondarySubForm(forms.ModelForm):
     """
@@ -222,12 +269,21 @@ class RecipeCombinedForm(forms.Form):
     
     This form allows the submission of both sections in a single form.
     """
+    main_form_class = RecipeMainSubForm
+    secondary_form_class = RecipeSecondarySubForm
+
+    @classmethod
+    def get_base_field_names(cls):
+        """Returns the names of the fields of both subforms, without instantiating any form."""
+
+        return [*cls.main_form_class.base_fields, *cls.secondary_form_class.base_fields]
+
     def __init__(self, *args, **kwargs):
         """Initializes the combined form with main and secondary subforms."""
 
         super().__init__(*args, **kwargs)
-        self.main_form = RecipeMainSubForm(*args, **kwargs)
-        self.secondary_form = RecipeSecondarySubForm(*args, **kwargs)
+        self.main_form = self.main_form_class(*args, **kwargs)
+        self.secondary_form = self.secondary_form_class(*args, **kwargs)
 
     def is_valid(self):
         """Validates both the main and secondary forms."""
@@ -246,32 +302,15 @@ class RecipeCombinedForm(forms.Form):
         }
 
     def save(self):
-        """Creates and saves a new Recipe object with the form data."""
-
-        title = self.main_form.cleaned_data["title"]
-        category = self.main_form.cleaned_data["category"]
-        source = self.main_form.cleaned_data["source"]
-        url_link = self.main_form.cleaned_data["url_link"]
-        content = self.main_form.cleaned_data["content"]
-        image = self.secondary_form.cleaned_data["image"]
-        cooking_time = self.secondary_form.cleaned_data["cooking_time"]
-        cooking_preparation = self.secondary_form.cleaned_data["cooking_preparation"]
-        resting_time = self.secondary_form.cleaned_data["resting_time"]
-        short_description = self.secondary_form.cleaned_data["short_description"]
-        
-        recipe = Recipe(
-            title=title,
-            category=category,
-            source=source,
-            url_link=url_link,
-            content=content,
-            image=image,
-            cooking_time=cooking_time,
-            cooking_preparation=cooking_preparation,
-            resting_time=resting_time,
-            short_description=short_description
-        )
-        recipe.save()
+        """
+        Creates and saves a new Recipe object with the form data.
+
+        Raises:
+        - ValidationError: If the title was taken by another recipe after the form was validated.
+          The error is also added to the main form.
+        """
+        recipe = Recipe(**self.main_form.cleaned_data, **self.secondary_form.cleaned_data)
+        save_with_unique_check(recipe, self.main_form, "title", "Titre déjà utilisé.")
 
         return recipe
 
@@ -299,14 +338,48 @@ class RecipeIngredientForm(forms.ModelForm):
         }
     field_order = ["name", "quantity", "unit"]
 
-    def save(self, commit=True):
+    @classmethod
+    def resolve_ingredients(cls, names):
+        """
+        Retrieves the ingredients matching the given names, creating the missing ones in a single batch.
+
+        Parameters:
+        - names (iterable of str): The ingredient names to resolve.
+
+        Returns:
+        - dict: A dictionary mapping each name to its Ingredient object.
+        """
+        names = set(names)
+        ingredients = {ingredient.name: ingredient for ingredient in Ingredient.objects.filter(name__in=names)}
+        missing_names = names - ingredients.keys()
+
+        if missing_names:
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name) for name in missing_names],
+                ignore_conflicts=True
+            )
+            ingredients.update(
+                {ingredient.name: ingredient for ingredient in Ingredient.objects.filter(name__in=missing_names)}
+            )
+
+        return ingredients
+
+    def save(self, commit=True, ingredients=None):
         """
         Saves the ingredient, creating it if it doesn't exist, and associates it with the recipe.
+
+        Parameters:
+        - commit (bool, optional): Whether to save the instance to the database.
+        - ingredients (dict, optional): Ingredients already resolved by 'resolve_ingredients', keyed by name.
+          Avoids a lookup per form when saving several forms at once.
         """
         cleaned_data = self.cleaned_data
         name = cleaned_data.get('name')
 
-        ingredient, created = Ingredient.objects.get_or_create(name=name)
+        if ingredients and name in ingredients:
+            ingredient = ingredients[name]
+        else:
+            ingredient, created = Ingredient.objects.get_or_create(name=name)
 
         instance = super().save(commit=False)
         instance.ingredient = ingredient
@@ -321,11 +394,11 @@ class AddRecipeToCollectionsForm(forms.Form):
     Form to manage the actions of adding a recipe to various collections 
     (album, history, trials).
     """
-    COLLECTION_NAME_MAPPING = {
+    COLLECTION_NAME_MAPPING = MappingProxyType({
         "album": "add_to_album",
         "history": "add_to_history",
         "trials": "add_to_trials"        
-    }
+    })
 
     add_to_album = forms.BooleanField(
         required= False,
@@ -353,11 +426,8 @@ class AddRecipeToCollectionsForm(forms.Form):
         """Ensures that at least one recipe collection is selected by the user."""
 
         cleaned_data = super().clean()
-        add_to_album = cleaned_data.get("add_to_album")
-        add_to_history = cleaned_data.get("add_to_history")
-        add_to_trials = cleaned_data.get("add_to_trials")
 
-        if not (add_to_album or add_to_history or add_to_trials):
+        if not any(cleaned_data.get(action_field) for action_field in self.COLLECTION_NAME_MAPPING.values()):
             raise forms.ValidationError("Vous devez cocher au moins une option.")
         
         return cleaned_data
@@ -379,30 +449,54 @@ class AddFriendForm(forms.Form):
         - logged_user (Member): The currently logged-in user attempting to modify their profile.
         """
         self.logged_user = logged_user
+        self.friend_cache = None
         super().__init__(*args, **kwargs)
 
     def clean_username_to_add(self):
-        """Validates that the username exists and is not already a friend of the logged-in user."""
+        """
+        Validates that the username exists and is not already a friend of the logged-in user.
 
+        Both checks are made with a single query, the friendship being annotated on the member lookup.
+        """
         cleaned_data = super().clean()
         username_to_add = cleaned_data.get("username_to_add")
 
-        try:
-            friend = Member.objects.get(username=username_to_add)
-        except Member.DoesNotExist:
+        friend_qs = Member.objects.filter(username=username_to_add).only("id")
+
+        if self.logged_user:
+            friend_qs = friend_qs.annotate(
+                is_friend=Exists(
+                    Member.friends.through.objects.filter(from_member=self.logged_user, to_member=OuterRef("pk"))
+                )
+            )
+        friend = friend_qs.first()
+
+        if friend is None:
             raise forms.ValidationError(f"Aucun utilisateur trouvé avec l'identifiant '{username_to_add}'.")
 
-        if self.logged_user and self.logged_user.friends.filter(id=friend.id).exists():
+        if getattr(friend, "is_friend", False):
             raise forms.ValidationError(f"'{username_to_add}' fait déjà partie de vos amis.")
 
+        self.friend_cache = friend
         return username_to_add
 
+    def get_friend(self):
+        """Returns the member to add found during validation, or None if the form is invalid."""
+
+        return self.friend_cache
+
 class CreateRecipeHistoryForm(forms.ModelForm):
     """Form to create a new recipe collection entry in the user's history collection."""
 
     class Meta:
         model = RecipeCollectionEntry
         fields = ["collection_name", "member", "recipe", "saving_date", "personal_note"]
+        # Duplicates are detected by the model's 'unique_history_entry_per_date' constraint during validation.
+        error_messages = {
+            NON_FIELD_ERRORS: {
+                "duplicate_history_entry": "La recette '%(title)s' fait déjà partie de votre historique pour la date du %(saving_date)s!",
+            },
+        }
     
     def __init__(self, *args, **kwargs):
         """Initializes the form and sets 'history' as the default collection name."""
@@ -413,25 +507,35 @@ class CreateRecipeHistoryForm(forms.ModelForm):
         self.fields["collection_name"].required = False
 
     def clean(self):
-        """
-        Validates that the recipe isn't already part of the user's history for the given date.
-        """
+        """Forces the entry into the 'history' collection."""
+
         cleaned_data = super().clean()
         cleaned_data["collection_name"] = "history"
-        saving_date = cleaned_data.get("saving_date")
-        member = cleaned_data.get("member")
-        recipe = cleaned_data.get("recipe")
-
-        if RecipeCollectionEntry.objects.filter(
-            collection_name="history",
-            member=member,
-            recipe=recipe,
-            saving_date=saving_date
-        ).exists():
-            raise forms.ValidationError(f"La recette '{recipe.title}' fait déjà partie de votre historique pour la date du {saving_date}!")
-        
+
         return cleaned_data
 
+    def save(self, commit=True):
+        """
+        Saves the history entry.
+
+        Raises:
+        - ValidationError: If the same entry was saved after the form was validated.
+          The error is also added to the form.
+        """
+        if not commit:
+            return super().save(commit=False)
+
+        try:
+            return super().save()
+        except DuplicateCollectionEntryError:
+            error = forms.ValidationError(
+                self._meta.error_messages[NON_FIELD_ERRORS]["duplicate_history_entry"],
+                code="duplicate_history_entry",
+                params=self.instance.get_duplicate_entry_params()
+            )
+            self.add_error(None, error)
+            raise error
+
 class DeleteRecipeHistoryForm(forms.Form):
     """
     Form to delete a recipe entry from the user's history by selecting a specific date.
@@ -452,8 +556,12 @@ class DeleteRecipeHistoryForm(forms.Form):
 
         if member and recipe:
             queryset = RecipeCollectionEntry.objects.filter(collection_name="history", member=member, recipe=recipe)
-            dates = queryset.values_list("saving_date", flat=True).distinct()
-            self.date_choices = [(date, date.strftime("%Y-%m-%d")) for date in dates]
+            self.date_choices = list(
+                queryset.annotate(saving_date_str=Cast("saving_date", output_field=CharField()))
+                .values_list("saving_date", "saving_date_str")
+                .order_by("-saving_date")
+                .distinct()
+            )
 
         self.fields["recipe_history_entry_date"] = forms.ChoiceField(
             choices=self.date_choices,
@@ -469,7 +577,7 @@ class BaseFilterRecipeForm(forms.Form):
     title = forms.CharField(label="titre de la recette:", required=False)
     category = forms.ChoiceField(
         label="type de plat:",
-        choices=[("", "tous")] + Recipe.CATEGORY_CHOICES,
+        choices=(("", "tous"), *Recipe.CATEGORY_CHOICES),
         required=False
     )
     ingredient_1 = forms.CharField(label="ingredient 1:", required=False)
@@ -486,13 +594,14 @@ class SearchRecipeForm(BaseFilterRecipeForm):
     - "member": An optional field to filter by logged-in user's friends.
     """
 
-    FORM_COLLECTION_CHOICES = [("", "toutes")] + [
-        (key, value) for key, value in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES if key != "trials"
-    ]
-    MEMBER_CHOICES = [
+    FORM_COLLECTION_CHOICES = (
+        ("", "toutes"),
+        *((key, value) for key, value in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES if key != "trials"),
+    )
+    MEMBER_CHOICES = (
         ("", "tous"),
         ("friends", "mes amis"),
-    ]
+    )
 
     collection_name = forms.ChoiceField(label="collection:", choices=FORM_COLLECTION_CHOICES, required=False)
 
@@ -527,7 +636,8 @@ class ShowRecipeCollectionForm(BaseFilterRecipeForm):
     )
     member = forms.ModelChoiceField(
         label="membre",
-        queryset=Member.objects.all(),
+        queryset=Member.objects.only("id", "username"),
+        widget=forms.HiddenInput,
         required=True
     )
     
\ No newline at end of file
@@ -7,19 +7,65 @@ between them. The models define how users interact with recipes, store their fav
 and track recipe details such as cooking time, ingredients, and personal notes.
 """
 from datetime import date
-from django.db import models
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
 from recipe_journal.utils.image_utils import compress_image
 
+class DuplicateCollectionEntryError(IntegrityError, ValueError):
+    """
+    Raised when a recipe collection entry already exists.
+
+    It remains an IntegrityError so that callers recovering from a concurrent insert, such as `get_or_create`,
+    still handle it.
+    """
+
+class CasefoldedCharField(models.CharField):
+    """
+    Stores the case-folded value of another field of the model, e.g. to compare titles regardless of case.
+
+    The value is computed in Python with `str.casefold()`, which unlike SQLite's lower() also folds accented
+    letters. It is computed whenever the instance is written, including through `bulk_create`.
+    """
+    def __init__(self, *args, source_field=None, **kwargs):
+        self.source_field = source_field
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source_field"] = self.source_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.source_field)
+        value = value.casefold() if value is not None else ""
+        setattr(model_instance, self.attname, value)
+        return value
+
 class Member(models.Model):
     """
     Represents a site member.
 
     A member can have multiple friends and has a username and password for authentication.
+    The password is stored hashed with Django's password hashers.
     """
     username = models.CharField(max_length=100, unique=True, null=False, blank=False)
-    password = models.CharField(max_length=60, null=False, blank=False)
+    password = models.CharField(max_length=128, null=False, blank=False)
     friends = models.ManyToManyField('self', symmetrical=False, related_name='connected_to', blank=True)
 
+    def check_password(self, raw_password):
+        """
+        Returns whether the raw password matches the stored hash.
+
+        If the hash was made with outdated hasher settings, it is rehashed with the current ones and saved.
+        """
+        def setter(raw_password):
+            self.password = make_password(raw_password)
+            self.save(update_fields=["password"])
+
+        return check_password(raw_password, self.password, setter)
+
 class Recipe(models.Model):
     """
     Represents a recipe with details such as title, category, ingredients, cooking times, and more.
@@ -28,13 +74,15 @@ class Recipe(models.Model):
     through a many-to-many relationship with the 'RecipeIngredient' model.
     """
 
-    CATEGORY_CHOICES = [
+    CATEGORY_CHOICES = (
         ("entrée", "entrée"),
         ("plat", "plat principal"),
         ("dessert", "dessert"),
-    ]
+    )
 
-    title = models.CharField(max_length=100, unique=True, null=False, blank=False)
+    title = models.CharField(max_length=100, null=False, blank=False)
+    # str.casefold() turns a character into at most three (e.g. 'ﬃ' into 'ffi'), hence three times the title length.
+    casefolded_title = CasefoldedCharField(max_length=300, unique=True, source_field="title")
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, null=False, blank=False)
     source = models.CharField(max_length=100, null=True, blank=True)
     url_link = models.CharField(max_length=100, null=True, blank=True)
@@ -47,23 +95,110 @@ class Recipe(models.Model):
     edition_date = models.DateField(default=date.today)
     image = models.ImageField(upload_to="recipe_images/", null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["category"]),
+        ]
+
+    @classmethod
+    def bulk_import(cls, recipes, batch_size=1000):
+        """
+        Inserts many recipes at once, e.g. when importing a cookbook.
+
+        The recipes are inserted with multi-row INSERT statements in a single transaction. Recipes whose title
+        is already used, regardless of case, or repeated in the import are left out before their image is
+        compressed and stored, so that no orphan image is written. As with `bulk_create`, `save()` is bypassed,
+        so the images are compressed here before the insert.
+
+        Parameters:
+        - recipes (iterable of Recipe): The unsaved recipes to insert.
+        - batch_size (int, optional): The number of recipes looked up or inserted per query.
+
+        Returns:
+        - list: The recipes inserted, without their primary key since conflicts are ignored.
+        """
+        recipes_by_title = {}
+        for recipe in recipes:
+            recipes_by_title.setdefault(recipe.title.casefold(), recipe)
+        casefolded_titles = list(recipes_by_title)
+
+        with transaction.atomic():
+            for start in range(0, len(casefolded_titles), batch_size):
+                for used_title in cls.objects.filter(
+                    casefolded_title__in=casefolded_titles[start:start + batch_size]
+                ).values_list("casefolded_title", flat=True):
+                    del recipes_by_title[used_title]
+
+            new_recipes = list(recipes_by_title.values())
+            for recipe in new_recipes:
+                if recipe.image:
+                    recipe.image = compress_image(recipe.image)
+
+            return cls.objects.bulk_create(new_recipes, batch_size=batch_size, ignore_conflicts=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Keeps the image name loaded from the database to detect image changes on save."""
+
+        instance = super().from_db(db, field_names, values)
+        if "image" in field_names:
+            instance._saved_image_name = values[field_names.index("image")]
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """Keeps the image name up to date when the image is reloaded from the database."""
+
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if "image" in self.get_deferred_fields():
+            self.__dict__.pop("_saved_image_name", None)
+        elif fields is None or "image" in fields:
+            self._saved_image_name = self.image.name
+
+    def validate_constraints(self, exclude=None):
+        """
+        Validates the model constraints, and that no other recipe uses the title regardless of case.
+
+        Raises:
+        - ValidationError: With the code 'duplicate_title' on the 'title' field if the title is already used.
+        """
+        super().validate_constraints(exclude=exclude)
+
+        if exclude and "title" in exclude:
+            return
+        if Recipe.objects.filter(casefolded_title=self.title.casefold()).exclude(pk=self.pk).exists():
+            raise ValidationError({"title": ValidationError("Titre déjà utilisé.", code="duplicate_title")})
+
+    def get_saved_image_name(self):
+        """
+        Returns the name of the image stored in the database for this recipe.
+
+        The name kept when the recipe was loaded or last saved is used, the database is only queried
+        if the image field was deferred.
+        """
+        if not self.pk:
+            return None
+        if hasattr(self, "_saved_image_name"):
+            return self._saved_image_name
+        return Recipe.objects.filter(pk=self.pk).values_list("image", flat=True).first()
+
     def save(self, *args, **kwargs):
         """
         Compress the image before saving if it's a new image.
 
         The image is only compressed if it's different from the existing one (for updates) 
-        or if it's a new image (for new objects). 
-        """
-        if self.pk:
-            old_image = Recipe.objects.filter(pk=self.pk).values_list("image", flat=True).first()
-            if self.image and self.image.name != old_image:
-                self.image = compress_image(self.image)
-        else:
-            if self.image:
-                self.image = compress_image(self.image)
+        or if it's a new image (for new objects), and never when `update_fields` leaves it out. 
+        """
+        update_fields = kwargs.get("update_fields")
+        saves_image = update_fields is None or "image" in update_fields
+
+        if saves_image and self.image and self.image.name != self.get_saved_image_name():
+            self.image = compress_image(self.image)
                 
         super().save(*args, **kwargs)
 
+        if saves_image:
+            self._saved_image_name = self.image.name
+
 class RecipeIngredient(models.Model):
     """
     Represents an ingredient in a recipe.
@@ -82,6 +217,13 @@ class Ingredient(models.Model):
     """   
     name = models.CharField(max_length=100, unique=True)
 
+# Defined at module level so that the constraints of 'RecipeCollectionEntry.Meta' can be derived from it.
+COLLECTION_CHOICES = (
+    ("history", "Historique de recettes"),
+    ("album", "Album de recettes"),
+    ("trials", "Liste de recettes à essayer"),
+)
+
 class RecipeCollectionEntry(models.Model):
     """
     Associates a recipe with a specific member, collection name, saving date, and a personal note.
@@ -89,11 +231,7 @@ class RecipeCollectionEntry(models.Model):
     This model helps track the recipes a member has in various collections (e.g., 'history', 'album', 'trials').
     A member can have different recipes saved in these collections, with an option to add personal notes for each.
     """
-    MODEL_COLLECTION_CHOICES = [
-        ("history", "Historique de recettes"),
-        ("album", "Album de recettes"),
-        ("trials", "Liste de recettes à essayer")
-    ]
+    MODEL_COLLECTION_CHOICES = COLLECTION_CHOICES
 
     collection_name = models.CharField(max_length=20, choices=MODEL_COLLECTION_CHOICES, null=False, blank=False, default="album")
     member = models.ForeignKey('Member', on_delete=models.CASCADE)
@@ -101,38 +239,135 @@ class RecipeCollectionEntry(models.Model):
     saving_date = models.DateField(default=date.today, null=False, blank=True)
     personal_note = models.TextField(null=True, blank=True)   
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["collection_name", "member", "saving_date"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member", "recipe", "saving_date"],
+                condition=models.Q(collection_name="history"),
+                name="unique_history_entry_per_date",
+                violation_error_code="duplicate_history_entry",
+            ),
+            models.UniqueConstraint(
+                fields=["member", "recipe", "collection_name"],
+                condition=models.Q(
+                    collection_name__in=[name for name, _ in COLLECTION_CHOICES if name != "history"]
+                ),
+                name="unique_collection_entry",
+            ),
+            models.CheckConstraint(
+                condition=models.Q(collection_name__in=[name for name, _ in COLLECTION_CHOICES]),
+                name="valid_collection_name",
+            ),
+        ]
+
+    @classmethod
+    def bulk_add(cls, entries, batch_size=500):
+        """
+        Inserts many collection entries at once, e.g. when adding several recipes to a collection.
+
+        The entries already present are skipped by the database constraints instead of being checked one by one.
+        As with `bulk_create`, `save()` is bypassed. The collection names are still checked beforehand since
+        some databases, like SQLite, also ignore check constraint violations when conflicts are ignored.
+
+        Parameters:
+        - entries (iterable of RecipeCollectionEntry): The unsaved entries to insert.
+        - batch_size (int, optional): The number of entries inserted per query.
+
+        Returns:
+        - list: The entries passed in, without their primary key since conflicts are ignored.
+
+        Raises:
+        - ValueError: If the collection name of an entry is not valid.
+        """
+        entries = list(entries)
+        collection_names = dict(cls.MODEL_COLLECTION_CHOICES)
+        for entry in entries:
+            if entry.collection_name not in collection_names:
+                raise ValueError(f"'{entry.collection_name}' n'est pas un choix valide.")
+
+        with transaction.atomic():
+            return cls.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+
     def save(self, *args, **kwargs):
         """
         Saves the entry to the database after validating it.
 
-        The validation checks if the recipe already exists in the specified collection for the given member and date.
-        If the recipe is in the 'history' collection, it checks for duplicate entries on the same date. 
-        If the recipe is in 'album' or 'trials', it ensures it hasn't been added before.
-        Raises ValueError if any validation fails.
-        """
-        if self.collection_name == "history":
-            if RecipeCollectionEntry.objects.filter(
-                member=self.member,
-                recipe=self.recipe,
-                collection_name=self.collection_name,
-                saving_date=self.saving_date
-            ).exists():
-                raise ValueError("Cette recette a déjà été ajoutée à l'historique pour cette date.")
-        elif self.collection_name in ["album", "trials"]:
-                if RecipeCollectionEntry.objects.filter(
-                    member=self.member,
-                    recipe=self.recipe,
-                    collection_name=self.collection_name
-                ).exists():
-                    raise ValueError(f"La recette est déjà présente dans la collection {self.collection_name}.")
-        else:
-            raise ValueError(f"'{self.collection_name}' n'est pas un choix valide.")
-    
-        super().save(*args, **kwargs)
+        The entry is validated by the database constraints: the collection name must be one of the choices,
+        and a recipe can be in the 'history' collection only once per date, and in the 'album' or 'trials'
+        collection only once.
+        Raises ValueError if the collection name is not valid, DuplicateCollectionEntryError if the entry
+        already exists. Any other IntegrityError is raised unchanged.
+        """
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as e:
+            violated_constraint = self.get_violated_constraint()
+            if violated_constraint == "valid_collection_name":
+                raise ValueError(f"'{self.collection_name}' n'est pas un choix valide.") from e
+            if violated_constraint == "unique_history_entry_per_date":
+                raise DuplicateCollectionEntryError(
+                    "Cette recette a déjà été ajoutée à l'historique pour cette date."
+                ) from e
+            if violated_constraint == "unique_collection_entry":
+                raise DuplicateCollectionEntryError(
+                    f"La recette est déjà présente dans la collection {self.collection_name}."
+                ) from e
+            raise
+
+    def validate_constraints(self, exclude=None):
+        """
+        Validates the model constraints.
+
+        The error of a duplicate history entry is given the recipe title and the saving date as parameters,
+        so that forms can mention them in their message.
+
+        Raises:
+        - ValidationError: If a constraint is violated.
+        """
+        try:
+            super().validate_constraints(exclude=exclude)
+        except ValidationError as e:
+            raise ValidationError({
+                field: [
+                    ValidationError(error.message, code=error.code, params=self.get_duplicate_entry_params())
+                    if error.code == "duplicate_history_entry" else error
+                    for error in errors
+                ]
+                for field, errors in e.error_dict.items()
+            })
+
+    def get_duplicate_entry_params(self):
+        """Returns the recipe title and the saving date, used in the messages about a duplicate entry."""
+
+        return {"title": self.recipe.title, "saving_date": self.saving_date}
+
+    def get_violated_constraint(self):
+        """
+        Returns the name of the first model constraint the entry violates, or None.
+
+        The constraints are checked again since SQLite doesn't name partial unique indexes in its errors.
+        """
+        for constraint in self._meta.constraints:
+            try:
+                constraint.validate(RecipeCollectionEntry, self)
+            except ValidationError:
+                return constraint.name
+        return None
     
     def __str__(self):
-        """Returns a string representation of the entry."""
+        """
+        Returns a string representation of the entry.
+
+        The recipe title and member username are only used if they were loaded with the entry,
+        their ids are used otherwise so that no query is made.
+        """
+        recipe = self.recipe.title if RecipeCollectionEntry.recipe.is_cached(self) else f"#{self.recipe_id}"
+        member = self.member.username if RecipeCollectionEntry.member.is_cached(self) else f"#{self.member_id}"
 
-        return f"{self.recipe.title} de la collection {self.collection_name} de {self.member.username}"
+        return f"{recipe} de la collection {self.collection_name} de {member}"
 
 
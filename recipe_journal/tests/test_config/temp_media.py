@@ -0,0 +1,27 @@
+"""Module defining a mixin for unit tests saving recipe images."""
+
+from django.test import override_settings
+from io import BytesIO
+from PIL import Image
+import tempfile
+
+class TempMediaRootMixin():
+    """
+    Stores the media files saved by the test class in a temporary directory, removed after the class has run.
+
+    Also provides `IMAGE_BYTES`, a small JPEG image generated once per class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # The override and the image are set up first, so that fixtures created in setUpTestData use them.
+        temp_media_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(temp_media_dir.cleanup)
+        cls.TEMP_MEDIA_ROOT = temp_media_dir.name
+        cls.media_root_override = override_settings(MEDIA_ROOT=cls.TEMP_MEDIA_ROOT)
+        cls.media_root_override.enable()
+        cls.addClassCleanup(cls.media_root_override.disable)
+        image_io = BytesIO()
+        Image.new("RGB", (64, 64), "red").save(image_io, format="JPEG", quality=95)
+        cls.IMAGE_BYTES = image_io.getvalue()
+        super().setUpClass()
@@ -1,18 +1,24 @@
 """Unit tests for the forms module."""
 
 from datetime import date, timedelta
+from django import forms
 from django.contrib.auth.hashers import make_password
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
-from recipe_journal.forms import *
-from recipe_journal.models import Ingredient, Member, Recipe, RecipeIngredient
-import shutil
-import tempfile
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase
+from recipe_journal.forms import AddFriendForm, AddRecipeToCollectionsForm, CreateRecipeHistoryForm, DeleteRecipeHistoryForm
+from recipe_journal.forms import LoginForm, ModifyProfileForm, RecipeCombinedForm, RecipeIngredientForm, RecipeMainSubForm
+from recipe_journal.forms import RegistrationForm, SearchRecipeForm, ShowRecipeCollectionForm
+from recipe_journal.models import Ingredient, Member, Recipe, RecipeCollectionEntry, RecipeIngredient
+from recipe_journal.tests.test_config.temp_media import TempMediaRootMixin
 from unittest.mock import patch
 
+HASHED_PASSWORD = make_password("password123")
+
 class LoginFormTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password123"))
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
 
     def test_form_with_non_existent_username(self):
         form_data = {"username": "invalid_username", "password": "password123"}
@@ -20,6 +26,15 @@ class LoginFormTest(TestCase):
 
         self.assertFalse(form.is_valid())
         self.assertIn("Identifiant ou mot de passe erroné.", form.non_field_errors())
+
+    def test_form_with_non_existent_username_still_hashes_password(self):
+        form_data = {"username": "invalid_username", "password": "password123"}
+
+        with patch("recipe_journal.forms.make_password") as mock_make_password:
+            form = LoginForm(data=form_data)
+            self.assertFalse(form.is_valid())
+
+        mock_make_password.assert_called_once_with("password123")
     
     def test_form_with_invalid_password(self):
         form_data = {"username": "testuser", "password": "invalid_password"}
@@ -33,10 +48,17 @@ class LoginFormTest(TestCase):
         form = LoginForm(data=form_data)
 
         self.assertTrue(form.is_valid())    
+        self.assertEqual(form.get_user(), self.member)
+
+    def test_form_without_valid_login_data_has_no_user(self):
+        form = LoginForm(data={"username": "testuser", "password": "invalid_password"})
+
+        self.assertFalse(form.is_valid())
+        self.assertIsNone(form.get_user())
 
 class RegistrationFormTest(TestCase):
     def test_form_with_taken_username(self):
-        Member.objects.create(username="testuser", password=make_password("password123"))
+        Member.objects.create(username="testuser", password=HASHED_PASSWORD)
         form_data = {"username": "testuser", "password": "password123"}
         form = RegistrationForm(data=form_data)
         
@@ -49,10 +71,32 @@ class RegistrationFormTest(TestCase):
         
         self.assertTrue(form.is_valid())
 
+    def test_form_with_username_taken_after_validation(self):
+        form = RegistrationForm(data={"username": "newuser", "password": "password123"})
+
+        self.assertTrue(form.is_valid())
+
+        Member.objects.create(username="newuser", password=HASHED_PASSWORD)
+
+        with self.assertRaises(forms.ValidationError):
+            form.save()
+        self.assertIn("Identifiant non disponible.", form.errors["username"])
+
+    def test_form_save_with_other_integrity_error(self):
+        form = RegistrationForm(data={"username": "newuser", "password": "password123"})
+
+        self.assertTrue(form.is_valid())
+
+        with patch("recipe_journal.forms.make_password", return_value=None):
+            with self.assertRaisesMessage(IntegrityError, "NOT NULL"):
+                form.save()
+        self.assertNotIn("username", form.errors)
+
 class ModifyProfileFormTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password123"))
-        self.existing_member = Member.objects.create(username="existing_user", password=make_password("password123"))
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
+        cls.existing_member = Member.objects.create(username="existing_user", password=HASHED_PASSWORD)
     
     def test_form_with_taken_username(self):
         form_data = {
@@ -66,6 +110,17 @@ class ModifyProfileFormTest(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn("Identifiant non disponible.", form.errors["username"])
 
+    def test_form_keeping_username_without_instance(self):
+        form_data = {
+            "username": "testuser",
+            "former_password": "password123",
+            "new_password": "new_password",
+            "confirm_new_password": "new_password"
+            }
+        form = ModifyProfileForm(data=form_data, logged_user=self.member)
+
+        self.assertTrue(form.is_valid())
+
     def test_form_with_incorrect_old_password(self):
         form_data = {
             "username": "testuser",
@@ -91,52 +146,30 @@ class ModifyProfileFormTest(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn("Les nouveaux mots de passe ne correspondent pas.", form.non_field_errors())
     
-    def test_form_with_multiple_valid_profile_data(self):
-        test_cases = [
-            {
-                "desc": "same_username",
-                "form_data": {
-                    "username": "testuser",
-                    "former_password": "password123",
-                    "new_password": "new_password",
-                    "confirm_new_password": "new_password"
-                }
-            },
-            {
-                "desc": "same_username_and_password",
-                "form_data": {
-                    "username": "testuser",
-                    "former_password": "password123",
-                    "new_password": "password123",
-                    "confirm_new_password": "password123"
-                }
-            },
-            {
-                "desc": "new_username",
-                "form_data": {
-                    "username": "new_username",
-                    "former_password": "password123",
-                    "new_password": "password123",
-                    "confirm_new_password": "password123"
-                }
-            },
-            {
-                "desc": "new_username_and_password",
-                "form_data": {
-                    "username": "new_username",
-                    "former_password": "password123",
-                    "new_password": "new_password",
-                    "confirm_new_password": "new_password"
-                }
-            }
-        ]
+    def _test_form_with_valid_profile_data(self, username, new_password):
+        form_data = {
+            "username": username,
+            "former_password": "password123",
+            "new_password": new_password,
+            "confirm_new_password": new_password
+        }
+        form = ModifyProfileForm(data=form_data, instance=self.member, logged_user=self.member)
+
+        self.assertTrue(form.is_valid())
+
+    def test_form_with_same_username(self):
+        self._test_form_with_valid_profile_data("testuser", "new_password")
 
-        for case in test_cases:
-            with self.subTest(msg=case["desc"]):
-                    form = ModifyProfileForm(data=case["form_data"], instance=self.member, logged_user=self.member)
-                    self.assertTrue(form.is_valid())
+    def test_form_with_same_username_and_password(self):
+        self._test_form_with_valid_profile_data("testuser", "password123")
 
-class RecipeActionFormTest(TestCase):
+    def test_form_with_new_username(self):
+        self._test_form_with_valid_profile_data("new_username", "password123")
+
+    def test_form_with_new_username_and_password(self):
+        self._test_form_with_valid_profile_data("new_username", "new_password")
+
+class RecipeActionFormTest(SimpleTestCase):
     def test_form_with_valid_action_selected(self):
         form_data = {
             "add_to_history": True,
@@ -146,9 +179,7 @@ class RecipeActionFormTest(TestCase):
         form = AddRecipeToCollectionsForm(data=form_data)
         
         self.assertTrue(form.is_valid())
-        self.assertEqual(form.cleaned_data["add_to_history"], True)
-        self.assertEqual(form.cleaned_data["add_to_album"], False)
-        self.assertEqual(form.cleaned_data["add_to_trials"], True)
+        self.assertEqual(form.cleaned_data, form_data)
 
 class AddMainRecipeFormTest(TestCase):
     def test_form_with_valid_data(self):
@@ -172,41 +203,51 @@ class AddMainRecipeFormTest(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn("Titre déjà utilisé.", form.errors["title"])
 
-class AddRecipeCombinedFormTest(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir="recipe_journal/tests/test_media/temp")
+    def test_form_with_taken_title_in_another_case(self):
+        Recipe.objects.create(title="Recette de test", category="dessert")
+        form = RecipeMainSubForm(data={"title": "recette DE test", "category": "entrée"})
 
-    @classmethod
-    def tearDownClass(cls):
-        shutil.rmtree(cls.TEMP_MEDIA_ROOT)
-        super().tearDownClass()
+        self.assertFalse(form.is_valid())
+        self.assertIn("Titre déjà utilisé.", form.errors["title"])
+
+    def test_form_with_taken_accented_title_in_another_case(self):
+        Recipe.objects.create(title="Éclair au café", category="dessert")
+        form = RecipeMainSubForm(data={"title": "éclair au CAFÉ", "category": "dessert"})
 
+        self.assertFalse(form.is_valid())
+        self.assertIn("Titre déjà utilisé.", form.errors["title"])
+
+class AddRecipeCombinedFormTest(TempMediaRootMixin, TestCase):
     def test_form_with_valid_recipe_data(self):
-        with patch("django.conf.settings.MEDIA_ROOT", new=self.TEMP_MEDIA_ROOT):
-            with open("recipe_journal/tests/test_media/image_test.jpg", "rb") as img_file:
-                image = SimpleUploadedFile(
-                    name="image_test.jpg",
-                    content=img_file.read(),
-                    content_type="image/jpeg"
-                )
-            form_data = {
-                "title": "Recette de test",
-                "category": "dessert",
-            }
-            form_files = {
-                "image": image
-            }
-            form = RecipeCombinedForm(data=form_data, files=form_files)
+        image = SimpleUploadedFile(name="image_test.jpg", content=self.IMAGE_BYTES, content_type="image/jpeg")
+        form_data = {
+            "title": "Recette de test",
+            "category": "dessert",
+        }
+        form_files = {
+            "image": image
+        }
+        form = RecipeCombinedForm(data=form_data, files=form_files)
 
-            self.assertTrue(form.is_valid())
-            
-            recipe = form.save()
+        self.assertTrue(form.is_valid())
+        
+        recipe = form.save()
+
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertTrue("image_test.jpg" in recipe.image.name)
+
+    def test_form_with_title_taken_after_validation(self):
+        form = RecipeCombinedForm(data={"title": "Recette de test", "category": "dessert"})
+
+        self.assertTrue(form.is_valid())
+
+        Recipe.objects.create(title="Recette de test", category="entrée")
+
+        with self.assertRaises(forms.ValidationError):
+            form.save()
+        self.assertIn("Titre déjà utilisé.", form.main_form.errors["title"])
+        self.assertEqual(Recipe.objects.filter(title="Recette de test").count(), 1)
 
-            self.assertTrue(recipe in Recipe.objects.all())
-            self.assertTrue("image_test.jpg" in recipe.image.name)
-    
     def test_form_with_empty_data(self):
         form_data = {"title": "", "category": ""}
         form = RecipeCombinedForm(form_data)
@@ -228,8 +269,8 @@ class AddRecipeIngredientFormTest(TestCase):
 
         recipe_ingredient = form.save()
 
-        self.assertTrue(recipe_ingredient in RecipeIngredient.objects.all())
-        self.assertTrue(recipe_ingredient.ingredient in Ingredient.objects.all())
+        self.assertTrue(RecipeIngredient.objects.filter(pk=recipe_ingredient.pk).exists())
+        self.assertTrue(Ingredient.objects.filter(pk=recipe_ingredient.ingredient_id).exists())
     
     def test_form_does_not_duplicate_ingredient(self):
         form_data_list = [
@@ -251,8 +292,28 @@ class AddRecipeIngredientFormTest(TestCase):
             
             form.save()
         
-        self.assertTrue(len(RecipeIngredient.objects.all())==2)
-        self.assertTrue(len(Ingredient.objects.all())==1)
+        self.assertEqual(RecipeIngredient.objects.count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_resolve_ingredients_creates_only_missing_ingredients(self):
+        existing_ingredient = Ingredient.objects.create(name="carotte")
+
+        ingredients = RecipeIngredientForm.resolve_ingredients(["carotte", "sucre", "sucre"])
+
+        self.assertEqual(set(ingredients), {"carotte", "sucre"})
+        self.assertEqual(ingredients["carotte"], existing_ingredient)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_form_with_resolved_ingredients(self):
+        ingredients = RecipeIngredientForm.resolve_ingredients(["carotte"])
+        form = RecipeIngredientForm(data={"name": "carotte", "quantity": 1.5, "unit": "kg"})
+
+        self.assertTrue(form.is_valid())
+
+        with self.assertNumQueries(1):
+            recipe_ingredient = form.save(ingredients=ingredients)
+
+        self.assertEqual(recipe_ingredient.ingredient, ingredients["carotte"])
 
 class AddRecipeToCollectionsTest(TestCase):
     def test_form_without_action_selected(self):
@@ -277,14 +338,16 @@ class AddRecipeToCollectionsTest(TestCase):
         self.assertTrue(form.is_valid())
 
 class AddFriendFormTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password=make_password("password123"))
-        self.friend = Member.objects.create(username="test_friend", password=make_password("password123"))
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password=HASHED_PASSWORD)
+        cls.friend = Member.objects.create(username="test_friend", password=HASHED_PASSWORD)
 
     def test_form_with_valid_username_to_add(self):
         form = AddFriendForm({"username_to_add": "test_friend"}, logged_user=self.member)
 
         self.assertTrue(form.is_valid())
+        self.assertEqual(form.get_friend(), self.friend)
 
     def test_form_with_non_existent_username_to_add(self):
         form = AddFriendForm({"username_to_add": "unvalid_username"}, logged_user=self.member)
@@ -299,10 +362,18 @@ class AddFriendFormTest(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn("'test_friend' fait déjà partie de vos amis.", form.errors["username_to_add"])
 
+    def test_form_validation_uses_a_single_query(self):
+        form = AddFriendForm({"username_to_add": "test_friend"}, logged_user=self.member)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+
 class CreateRecipeHistoryFormTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password=make_password("password123"))
-        self.recipe = Recipe.objects.create(title = "recette test", category = "dessert")
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password=HASHED_PASSWORD)
+        cls.recipe = Recipe.objects.create(title = "recette test", category = "dessert")
+        cls.TODAY = date.today()
 
     def test_form_with_valid_data(self):
         form_data = {
@@ -318,59 +389,102 @@ class CreateRecipeHistoryFormTest(TestCase):
             collection_name = "history",
             member = self.member,
             recipe = self.recipe,
-            saving_date = date.today()
+            saving_date = self.TODAY
         )
         form_data = {
             "member": self.member,
             "recipe": self.recipe,
-            "saving_date": date.today()
+            "saving_date": self.TODAY
         }
         form = CreateRecipeHistoryForm(form_data)
 
         self.assertFalse(form.is_valid())
         self.assertIn(
-            f"La recette '{self.recipe.title}' fait déjà partie de votre historique pour la date du {date.today()}!",
+            f"La recette '{self.recipe.title}' fait déjà partie de votre historique pour la date du {self.TODAY}!",
+            form.non_field_errors()
+            )
+
+    def test_form_without_date_with_recipe_already_in_history_today(self):
+        RecipeCollectionEntry.objects.create(
+            collection_name = "history",
+            member = self.member,
+            recipe = self.recipe,
+        )
+        form = CreateRecipeHistoryForm({"member": self.member, "recipe": self.recipe})
+
+        self.assertFalse(form.is_valid())
+        self.assertIn(
+            f"La recette '{self.recipe.title}' fait déjà partie de votre historique pour la date du {self.TODAY}!",
             form.non_field_errors()
             )
     
+    def test_form_save_with_entry_added_after_validation(self):
+        form = CreateRecipeHistoryForm({"member": self.member, "recipe": self.recipe})
+        self.assertTrue(form.is_valid())
+        RecipeCollectionEntry.objects.create(collection_name="history", member=self.member, recipe=self.recipe)
+
+        with self.assertRaises(forms.ValidationError):
+            form.save()
+        self.assertIn(
+            f"La recette '{self.recipe.title}' fait déjà partie de votre historique pour la date du {self.TODAY}!",
+            form.non_field_errors()
+            )
+
+    def test_form_save_with_invalid_data(self):
+        form = CreateRecipeHistoryForm({"recipe": self.recipe})
+
+        self.assertFalse(form.is_valid())
+        with self.assertRaisesMessage(ValueError, "didn't validate"):
+            form.save()
+
 class DeleteRecipeHistoryFormTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password=make_password("password123"))
-        self.recipe = Recipe.objects.create(title = "recette test", category = "dessert")
-        self.recipe_2 = Recipe.objects.create(title = "recette test 2", category = "dessert")
-        for day_delta in range(2):
-            RecipeCollectionEntry.objects.create(
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password=HASHED_PASSWORD)
+        cls.recipe = Recipe.objects.create(title = "recette test", category = "dessert")
+        cls.recipe_2 = Recipe.objects.create(title = "recette test 2", category = "dessert")
+        cls.TODAY = date.today()
+        RecipeCollectionEntry.objects.bulk_create([
+            RecipeCollectionEntry(
                 collection_name = "history",
-                member = self.member,
-                recipe = self.recipe,
-                saving_date = date.today()- timedelta(days=day_delta)
+                member = cls.member,
+                recipe = cls.recipe,
+                saving_date = cls.TODAY - timedelta(days=day_delta)
             )
+            for day_delta in range(2)
+        ])
 
     def test_form_with_valid_history_dates(self):
-        form = DeleteRecipeHistoryForm({"recipe_history_entry_date": date.today()}, member=self.member, recipe=self.recipe)
-        dates_set = set([date_choice[0] for date_choice in form.fields["recipe_history_entry_date"].choices])
-        expected_dates_set = set([date.today() - timedelta(days=day_delta) for day_delta in range(2)])
-        
-        self.assertEqual(dates_set, expected_dates_set)
+        form = DeleteRecipeHistoryForm({"recipe_history_entry_date": self.TODAY}, member=self.member, recipe=self.recipe)
+        self.assertCountEqual(
+            [date_choice[0] for date_choice in form.fields["recipe_history_entry_date"].choices],
+            [self.TODAY - timedelta(days=day_delta) for day_delta in range(2)]
+            )
         self.assertTrue(form.is_valid())
+
+    def test_form_date_choices_are_formatted_and_sorted(self):
+        form = DeleteRecipeHistoryForm(member=self.member, recipe=self.recipe)
+        expected_choices = [
+            (self.TODAY - timedelta(days=day_delta), (self.TODAY - timedelta(days=day_delta)).strftime("%Y-%m-%d"))
+            for day_delta in range(2)
+        ]
+
+        self.assertEqual(form.date_choices, expected_choices)
     
     def test_form_with_recipe_not_in_history(self):
-        form = DeleteRecipeHistoryForm({"recipe_history_entry_date": date.today()}, member=self.member, recipe=self.recipe_2)
-        dates_set = set([date_choice[0] for date_choice in form.fields["recipe_history_entry_date"].choices])
-        
-        self.assertEqual(len(dates_set), 0)
+        form = DeleteRecipeHistoryForm({"recipe_history_entry_date": self.TODAY}, member=self.member, recipe=self.recipe_2)
+        self.assertEqual(list(form.fields["recipe_history_entry_date"].choices), [])
         self.assertFalse(form.is_valid())
         self.assertIn("Select a valid choice", form.errors["recipe_history_entry_date"][0])
 
 class SearchRecipeFormTest(TestCase):
     def test_form_with_collection_names_exluding_trials(self):
-        collection_choices = dict(RecipeCollectionEntry.MODEL_COLLECTION_CHOICES)
-        for collection_name in collection_choices:
-            if collection_name != "trials":
-                with self.subTest():
-                    form = SearchRecipeForm({"collection": collection_name})
-                    
-                    self.assertTrue(form.is_valid())
+        collection_names = [name for name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES if name != "trials"]
+        for collection_name in collection_names:
+            with self.subTest(msg=collection_name):
+                form = SearchRecipeForm({"collection_name": collection_name})
+                
+                self.assertTrue(form.is_valid())
     
     def test_form_with_member_friends_option(self):
         form = SearchRecipeForm({"member": "friends"})
@@ -378,8 +492,9 @@ class SearchRecipeFormTest(TestCase):
         self.assertTrue(form.is_valid())
 
 class ShowRecipeCollectionFormTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password=make_password("password123"))
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password=HASHED_PASSWORD)
     
     def _test_form_with_valid_collection_name(self, collection_name):
         form = ShowRecipeCollectionForm({"collection_name": collection_name, "member": self.member})
@@ -399,13 +514,12 @@ class ShowRecipeCollectionFormTest(TestCase):
         self.assertTrue(any("This field is required" in error_msg for error_msg in form.errors["collection_name"]))
     
     def test_form_without_member(self):
-         for collection_name in dict(RecipeCollectionEntry.MODEL_COLLECTION_CHOICES):
-            with self.subTest(msg=collection_name):
-                form = ShowRecipeCollectionForm({"collection_name": collection_name})
+        collection_name = RecipeCollectionEntry.MODEL_COLLECTION_CHOICES[0][0]
+        form = ShowRecipeCollectionForm({"collection_name": collection_name})
 
-                self.assertFalse(form.is_valid())
-                self.assertIn("member", form.errors)
-                self.assertTrue(any("This field is required" in error_msg for error_msg in form.errors["member"]))
+        self.assertFalse(form.is_valid())
+        self.assertIn("member", form.errors)
+        self.assertTrue(any("This field is required" in error_msg for error_msg in form.errors["member"]))
     
     def test_collection_name_choices_match_model(self):
         form = ShowRecipeCollectionForm()
@@ -4,71 +4,150 @@ from datetime import date
 from django.contrib.auth.hashers import make_password
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import IntegrityError
+from django.db.models import Q
 from django.test import TestCase
 import os
-from recipe_journal.models import *
-import shutil
-import tempfile
+from recipe_journal.models import DuplicateCollectionEntryError, Ingredient, Member, Recipe, RecipeCollectionEntry
+from recipe_journal.models import RecipeIngredient
+from recipe_journal.tests.test_config.temp_media import TempMediaRootMixin
 from unittest.mock import patch
 
+HASHED_PASSWORD = make_password("password123")
+
 class MemberModelTest(TestCase):
     def test_model_username_must_be_unique(self):
-        Member.objects.create(username="testuser", password=make_password("password123"))
+        Member.objects.create(username="testuser", password=HASHED_PASSWORD)
         
         with self.assertRaises(IntegrityError):
-            Member.objects.create(username="testuser", password=make_password("newpassword123"))
+            Member.objects.create(username="testuser", password=HASHED_PASSWORD)
 
-class RecipeModelTest(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir="recipe_journal/tests/test_media/temp")
+    def test_model_check_password_upgrades_outdated_hash(self):
+        outdated_password = make_password("password123", salt="salt")
+        member = Member.objects.create(username="testuser", password=outdated_password)
 
-    @classmethod
-    def tearDownClass(cls):
-        shutil.rmtree(cls.TEMP_MEDIA_ROOT)
-        super().tearDownClass()
+        self.assertFalse(member.check_password("wrongpassword"))
+        self.assertTrue(member.check_password("password123"))
+        member.refresh_from_db()
+        self.assertNotEqual(member.password, outdated_password)
+        self.assertTrue(member.check_password("password123"))
 
+class RecipeModelTest(TempMediaRootMixin, TestCase):
     def test_model_title_must_be_unique(self):
         Recipe.objects.create(title="recipe_title", category="entrée")
 
         self.assertTrue(Recipe.objects.filter(title="recipe_title", category="entrée").exists())
         with self.assertRaises(IntegrityError):
             Recipe.objects.create(title="recipe_title", category="plat") 
+
+    def test_model_title_must_be_unique_regardless_of_case(self):
+        Recipe.objects.create(title="recipe_title", category="entrée")
+
+        with self.assertRaises(IntegrityError):
+            Recipe.objects.create(title="Recipe_Title", category="plat")
+
+    def test_model_casefolded_title_fits_a_full_length_title(self):
+        title = "ß" * Recipe._meta.get_field("title").max_length
+        recipe = Recipe.objects.create(title=title, category="dessert")
+
+        self.assertEqual(recipe.casefolded_title, "ss" * len(title))
+        self.assertLessEqual(len(recipe.casefolded_title), Recipe._meta.get_field("casefolded_title").max_length)
+
+    def test_model_title_must_be_unique_regardless_of_accented_letters_case(self):
+        Recipe.objects.create(title="Éclair au café", category="dessert")
+
+        with self.assertRaises(IntegrityError):
+            Recipe.objects.create(title="éclair AU CAFÉ", category="dessert")
     
-    def test_model_image_is_compressed_only_once(self):
-        with patch("django.conf.settings.MEDIA_ROOT", new=self.TEMP_MEDIA_ROOT):
-            with open("recipe_journal/tests/test_media/image_test.jpg", "rb") as img_file:
-                image = SimpleUploadedFile(
-                    name="image_test.jpg",
-                    content=img_file.read(),
-                    content_type="image/jpeg"
-                )
+    def test_model_bulk_import_skips_used_titles(self):
+        Recipe.objects.create(title="recipe_title", category="entrée")
+        recipes = [
+            Recipe(title="Recipe_Title", category="plat"),
+            Recipe(title="recipe_title_2", category="plat"),
+            Recipe(title="recipe_title_3", category="dessert"),
+        ]
 
-            initial_image_weight = len(image.read())
-            recipe = Recipe.objects.create(
-                title="recipe_title",
-                category="entrée",
-                image=image
-                )
-            
-            image_weight_after_saving = os.path.getsize(recipe.image.path)
+        with patch("recipe_journal.models.compress_image") as mock_compress_image:
+            Recipe.bulk_import(recipes, batch_size=2)
 
-            self.assertTrue(
-                image_weight_after_saving < initial_image_weight,
-                "L'image devrait avoir été compressée."
-                )
-            self.assertTrue(recipe in Recipe.objects.all())
-            self.assertTrue("image_test.jpg" in recipe.image.name)
+        mock_compress_image.assert_not_called()
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(Recipe.objects.get(title__iexact="recipe_title").category, "entrée")
+
+    def test_model_bulk_import_stores_images_of_inserted_recipes_only(self):
+        Recipe.objects.create(title="Éclair", category="dessert")
+        recipes = [
+            Recipe(
+                title=title,
+                category="dessert",
+                image=SimpleUploadedFile(name=f"{name}.jpg", content=self.IMAGE_BYTES, content_type="image/jpeg")
+            )
+            for title, name in [("éclair", "skipped_image"), ("Tarte", "imported_image"), ("TARTE", "repeated_image")]
+        ]
+
+        Recipe.bulk_import(recipes)
+        recipe = Recipe.objects.get(title="Tarte")
+        stored_file_names = os.listdir(os.path.join(self.TEMP_MEDIA_ROOT, "recipe_images"))
 
-            recipe.image = image
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertIn("imported_image", recipe.image.name)
+        self.assertFalse(any(name.startswith(("skipped_image", "repeated_image")) for name in stored_file_names))
+
+    def test_model_update_does_not_query_saved_image(self):
+        Recipe.objects.create(title="recipe_title", category="entrée")
+        recipe = Recipe.objects.get(title="recipe_title")
+        recipe.category = "plat"
+
+        with self.assertNumQueries(1):
             recipe.save()
-            image_weight_after_second_saving = os.path.getsize(recipe.image.path)
 
-            self.assertTrue(
-                image_weight_after_saving == image_weight_after_second_saving,
-                "L'image ne devrait pas avoir été compressée à nouveau."
-                )
+    def test_model_image_is_not_compressed_after_refresh_from_db(self):
+        recipe = Recipe.objects.create(title="recipe_title", category="entrée")
+        Recipe.objects.filter(pk=recipe.pk).update(image="recipe_images/image_test.jpg")
+        recipe.refresh_from_db()
+
+        with patch("recipe_journal.models.compress_image") as mock_compress_image:
+            recipe.save()
+
+        mock_compress_image.assert_not_called()
+
+    def test_model_image_is_not_compressed_when_left_out_of_update_fields(self):
+        recipe = Recipe.objects.create(title="recipe_title", category="entrée")
+        recipe.image = "recipe_images/image_test.jpg"
+        recipe.category = "plat"
+
+        with patch("recipe_journal.models.compress_image") as mock_compress_image:
+            recipe.save(update_fields=["category"])
+
+        mock_compress_image.assert_not_called()
+
+    def test_model_image_is_compressed_only_once(self):
+        image = SimpleUploadedFile(name="image_test.jpg", content=self.IMAGE_BYTES, content_type="image/jpeg")
+
+        initial_image_weight = len(image.read())
+        recipe = Recipe.objects.create(
+            title="recipe_title",
+            category="entrée",
+            image=image
+            )
+        
+        image_weight_after_saving = os.path.getsize(recipe.image.path)
+
+        self.assertTrue(
+            image_weight_after_saving < initial_image_weight,
+            "L'image devrait avoir été compressée."
+            )
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertTrue("image_test.jpg" in recipe.image.name)
+
+        recipe.image = image
+        recipe.save()
+        image_weight_after_second_saving = os.path.getsize(recipe.image.path)
+
+        self.assertTrue(
+            image_weight_after_saving == image_weight_after_second_saving,
+            "L'image ne devrait pas avoir été compressée à nouveau."
+            )
 
 class IngredientModelTest(TestCase):
     def test_model_with_valid_name(self):
@@ -83,7 +162,8 @@ class IngredientModelTest(TestCase):
             Ingredient.objects.create(name="Sugar")
 
 class RecipeIngredientModelTest(TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         Ingredient.objects.create(name="Flour")
 
     def test_model_valid_data(self):
@@ -102,11 +182,11 @@ class RecipeIngredientModelTest(TestCase):
             ingredient=ingredient, quantity=2.5, unit="cups"
         )
 
-        self.assertTrue(len(RecipeIngredient.objects.all()) == 1)
+        self.assertEqual(RecipeIngredient.objects.count(), 1)
 
         Ingredient.objects.filter(name="Flour").delete()
 
-        self.assertTrue(len(RecipeIngredient.objects.all()) == 0)
+        self.assertEqual(RecipeIngredient.objects.count(), 0)
         
 class IngredientModelTest(TestCase):
     def test_model_valid_name(self):
@@ -121,25 +201,102 @@ class IngredientModelTest(TestCase):
             Ingredient.objects.create(name="jambon")
 
 class RecipeCollectionModelTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password123"))
-        self.recipe = Recipe.objects.create(title="recipe_title", category="entrée")
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
+        cls.recipe = Recipe.objects.create(title="recipe_title", category="entrée")
     
     def test_model_valid_data(self):
-        for collection_name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES:
-            
-            with self.subTest(msg=collection_name):
+        recipe_collections = RecipeCollectionEntry.objects.bulk_create([
+            RecipeCollectionEntry(collection_name=collection_name, member=self.member, recipe=self.recipe)
+            for collection_name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES
+        ])
+
+        for recipe_collection in recipe_collections:
+            with self.subTest(msg=recipe_collection.collection_name):
                 form_data = {
-                    "collection_name": collection_name,
+                    "collection_name": recipe_collection.collection_name,
                     "member": self.member,
                     "recipe": self.recipe,
                 }
 
-                recipe_collection = RecipeCollectionEntry.objects.create(**form_data)
-
                 self.assertTrue(RecipeCollectionEntry.objects.filter(**form_data).exists())
                 self.assertEqual(recipe_collection.saving_date, date.today())
     
+    def test_model_duplicate_entry(self):
+        test_cases = [
+            ("history", "Cette recette a déjà été ajoutée à l'historique pour cette date."),
+            ("album", "La recette est déjà présente dans la collection album."),
+            ("trials", "La recette est déjà présente dans la collection trials."),
+        ]
+        for collection_name, expected_message in test_cases:
+            with self.subTest(msg=collection_name):
+                form_data = {"collection_name": collection_name, "member": self.member, "recipe": self.recipe}
+                RecipeCollectionEntry.objects.create(**form_data)
+
+                with self.assertRaisesMessage(DuplicateCollectionEntryError, expected_message):
+                    RecipeCollectionEntry.objects.create(**form_data)
+                self.assertEqual(RecipeCollectionEntry.objects.filter(**form_data).count(), 1)
+
+    def test_model_bulk_add_skips_existing_entries(self):
+        RecipeCollectionEntry.objects.create(collection_name="album", member=self.member, recipe=self.recipe)
+        entries = [
+            RecipeCollectionEntry(collection_name=collection_name, member=self.member, recipe=self.recipe)
+            for collection_name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES
+        ]
+
+        RecipeCollectionEntry.bulk_add([*entries, *entries])
+
+        self.assertEqual(RecipeCollectionEntry.objects.count(), 3)
+
+    def test_model_bulk_add_with_invalid_collection_name(self):
+        entry = RecipeCollectionEntry(collection_name="invalid_collection_name", member=self.member, recipe=self.recipe)
+
+        with self.assertRaises(ValueError):
+            RecipeCollectionEntry.bulk_add([entry])
+        self.assertFalse(RecipeCollectionEntry.objects.exists())
+
+    def test_model_invalid_collection_name_raises_value_error(self):
+        with self.assertRaisesMessage(ValueError, "'invalid_collection_name' n'est pas un choix valide."):
+            RecipeCollectionEntry.objects.create(
+                collection_name="invalid_collection_name",
+                member=self.member,
+                recipe=self.recipe
+                )
+
+    def test_model_other_integrity_errors_are_not_translated(self):
+        with self.assertRaisesMessage(IntegrityError, "NOT NULL"):
+            RecipeCollectionEntry.objects.create(collection_name="album", recipe=self.recipe)
+
+    def test_model_constraints_follow_collection_choices(self):
+        constraints = {constraint.name: constraint for constraint in RecipeCollectionEntry._meta.constraints}
+        collection_names = [name for name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES]
+
+        self.assertEqual(constraints["valid_collection_name"].condition, Q(collection_name__in=collection_names))
+        self.assertEqual(
+            constraints["unique_collection_entry"].condition,
+            Q(collection_name__in=[name for name in collection_names if name != "history"])
+            )
+
+    def test_model_collection_name_is_checked_by_the_database(self):
+        RecipeCollectionEntry.objects.create(collection_name="album", member=self.member, recipe=self.recipe)
+
+        with self.assertRaises(IntegrityError):
+            RecipeCollectionEntry.objects.update(collection_name="invalid_collection_name")
+
+    def test_model_str(self):
+        entry = RecipeCollectionEntry.objects.create(collection_name="album", member=self.member, recipe=self.recipe)
+        expected_str = f"recipe_title de la collection album de {self.member.username}"
+
+        self.assertEqual(str(entry), expected_str)
+        with self.assertNumQueries(1):
+            self.assertEqual(str(RecipeCollectionEntry.objects.select_related("recipe", "member").get()), expected_str)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                str(RecipeCollectionEntry.objects.get()),
+                f"#{self.recipe.id} de la collection album de #{self.member.id}"
+                )
+
     def test_model_invalid_data(self):
         test_cases = [
             {
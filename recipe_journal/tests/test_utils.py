@@ -5,6 +5,7 @@ from django.contrib.auth.hashers import make_password
 from django.contrib.messages import get_messages
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.db import transaction
+from django.db.models import QuerySet
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
 import json
@@ -17,11 +18,12 @@ from recipe_journal.utils.utils import *
 from unittest.mock import MagicMock, patch
 
 path = MockFunctionPathManager()
+HASHED_PASSWORD = make_password("password")
 
 class GetLoggedUserTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password"))
-        self.member.save()
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
 
     def test_get_logged_with_valid_login_data(self):
         self.client.post(reverse("login"), {"username": "testuser", "password": "password"})
@@ -59,8 +61,7 @@ class GetDailyRandomSampleTest(TestCase):
         self.assertEqual(len(result), 1)
 
     def test_get_daily_random_sample_randomness(self):
-        for ind in range(10):
-            Recipe.objects.create(title=f"Recipe {ind}")
+        Recipe.objects.bulk_create([Recipe(title=f"Recipe {ind}") for ind in range(10)])
        
         result = get_daily_random_sample(2)
         
@@ -68,9 +69,9 @@ class GetDailyRandomSampleTest(TestCase):
         self.assertTrue(all(id in range(1, 11) for id in result))
 
 class GetTopAndThumbnailRecipesTest(TestCase):
-    def setUp(self):
-        for ind in range(1, 11):
-            Recipe.objects.create(title=f"recette {ind}", category="dessert")
+    @classmethod
+    def setUpTestData(cls):
+        Recipe.objects.bulk_create([Recipe(title=f"recette {ind}", category="dessert") for ind in range(1, 11)])
     
     def test_get_top_and_thumbnail_recipes_recipe_ids_list_longer_than_top_recipe_nb(self):
         recipe_ids_list = list(range(1, 7))
@@ -118,6 +119,12 @@ class GetTopAndThumbnailRecipesTest(TestCase):
         self.assertEqual(thumbnail_recipe_qs.count(), 8)
         self.assertEqual(set(thumbnail_recipe_qs), set(Recipe.objects.filter(id__in=recipe_ids_list[2:])))
 
+    def test_get_top_and_thumbnail_recipes_defer_content(self):
+        top_recipe_qs, thumbnail_recipe_qs = get_top_and_thumbnail_recipes(list(range(1, 7)), 2)
+
+        for recipe in [*top_recipe_qs, *thumbnail_recipe_qs]:
+            self.assertIn("content", recipe.get_deferred_fields())
+
 class ValidateTitleTest(TestCase):
     def test_validate_title_title_too_long(self):
         title = 30*"title trop long"
@@ -130,8 +137,7 @@ class ValidateTitleTest(TestCase):
         self.assertIsNone(validate_title(title))
 
 class GetRecipeIngredientListTest(TestCase):
-    def setUp(self):
-        self.factory = RequestFactory()
+    factory = RequestFactory()
 
     def test_get_recipe_ingredient_list_valid_data(self):
         form_data = {
@@ -209,8 +215,7 @@ class GetRecipeIngredientFormListTest(TestCase):
         self.assertFalse(recipe_ingredient_form_list[0].is_valid())
 
 class InitializecombinedFormTest(TestCase):
-    def setUp(self):
-        self.factory = RequestFactory()
+    factory = RequestFactory()
     
     def test_initialize_combined_form_valid_data(self):
         form_data = {
@@ -230,8 +235,7 @@ class InitializecombinedFormTest(TestCase):
         self.assertEqual(cleaned_data["secondary_form"]["cooking_time"], 10)
 
 class InitializeFormTest(TestCase):
-    def setUp(self):
-        self.factory = RequestFactory()
+    factory = RequestFactory()
     
     def test_initialize_form_valid_data(self):
         request = self.factory.post("/", {"add_to_album": True})
@@ -241,6 +245,8 @@ class InitializeFormTest(TestCase):
         self.assertEqual(form.cleaned_data["add_to_album"], True)
          
 class PrepareRecipeFormsTest(TestCase):
+    factory = RequestFactory()
+
     @patch.object(utils, path.INITIALIZE_FORM)
     @patch.object(utils, path.INITIALIZE_COMBINED_FORM)
     @patch.object(utils, path.GET_RECIPE_INGREDIENT_FORM_LIST)
@@ -257,7 +263,6 @@ class PrepareRecipeFormsTest(TestCase):
         mock_initialize_combined_form.return_value = "mock_recipe_form"
         mock_initialize_form.return_value = "mock_recipe_action_form"
         
-        self.factory = RequestFactory()
         self.request = self.factory.post("/")
         recipe_form, recipe_ingredient_form_list, recipe_action_form = prepare_recipe_forms(self.request)
         
@@ -295,12 +300,25 @@ class SaveRecipeAndIngredientsTest(TestCase):
     def test_save_recipe_and_ingredients(self):
         recipe = save_recipe_and_ingredients(self.recipe_form, self.recipe_ingredient_form_list)
         
-        self.assertIn(recipe, Recipe.objects.all())
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+    def test_save_recipe_and_ingredients_links_all_ingredients(self):
+        recipe_ingredient_form_list = [
+            RecipeIngredientForm({"name": name, "quantity": 1, "unit": "kg"}) for name in ("carotte", "navet", "carotte")
+        ]
+        for recipe_ingredient_form in recipe_ingredient_form_list:
+            recipe_ingredient_form.is_valid()
+
+        recipe = save_recipe_and_ingredients(self.recipe_form, recipe_ingredient_form_list)
+
+        self.assertEqual(recipe.recipe_ingredient.count(), 3)
+        self.assertEqual(Ingredient.objects.count(), 2)
 
 class CreateRecipeCollectionEntryTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
-        self.recipe = Recipe.objects.create(title="recette test", category="plat")
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
+        cls.recipe = Recipe.objects.create(title="recette test", category="plat")
 
     def _test_create_recipe_collection_entry(self, add_recipe_to_collection_form_data):
         add_recipe_to_collection_form = AddRecipeToCollectionsForm(add_recipe_to_collection_form_data)
@@ -347,8 +365,9 @@ class CreateRecipeCollectionEntryTest(TestCase):
                     transaction.set_rollback(True)
 
 class AddRecipeToCollectionsTest(TestCase):
+    factory = RequestFactory()
+
     def setUp(self):
-        self.factory = RequestFactory()
         self.request = self.factory.post("/")
         setattr(self.request, "session", {})
         setattr(self.request, "_messages", FallbackStorage(self.request))
@@ -416,10 +435,12 @@ class AddRecipeToCollectionsTest(TestCase):
         self.assertEqual(len(get_messages(self.request)), 0)
 
 class HandleAddFriendRequestTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
-        self.friend  = Member.objects.create(username="test_friend", password="password")
-        self.factory = RequestFactory()
+    factory = RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
+        cls.friend  = Member.objects.create(username="test_friend", password="password")
         
     def test_handle_add_friend_request_empty_form(self):
         request = self.factory.post("/")
@@ -444,10 +465,12 @@ class HandleAddFriendRequestTest(TestCase):
         self.assertIn(self.friend, self.member.friends.all())
     
 class HandleRemoveFriendRequestTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
-        self.friend  = Member.objects.create(username="test_friend", password="password")
-        self.factory = RequestFactory()
+    factory = RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
+        cls.friend  = Member.objects.create(username="test_friend", password="password")
     
     def test_handle_remove_friend_request_empty_username_to_remove(self):
         request = self.factory.post("/", {"username_to_remove": ""})
@@ -495,6 +518,13 @@ class NormalizeIngredienTest(TestCase):
 
         self.assertIsNone(result)
 
+    def test_normalize_ingredient_is_cached(self):
+        normalize_ingredient.cache_clear()
+        normalize_ingredient("carottes")
+        normalize_ingredient("carottes")
+
+        self.assertEqual(normalize_ingredient.cache_info().hits, 1)
+
 class GetIngredientInputsTest(TestCase):
     @patch.object(utils, path.NORMALIZE_INGREDIENT)
     def test_get_ingredient_inputs_valid_form(self, mock_normalize_ingredient):
@@ -513,7 +543,8 @@ class GetIngredientInputsTest(TestCase):
         self.assertEqual(set(ingredient_inputs_dict.items()), set(zip(form_data.keys(), side_effect)))
 
 class GetRecipeCollectionBySortOrderTest(TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         member = Member.objects.create(username="test user", password="password")
         for ind in range(1, 5):
             recipe = Recipe.objects.create(title=f"recette test {ind}", category="dessert")
@@ -537,7 +568,7 @@ class GetRecipeCollectionBySortOrderTest(TestCase):
     def test_get_recipe_collection_by_sort_order_non_history(self):
         for collection_name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES:
             if collection_name!="history":
-                with self.subTest():
+                with self.subTest(msg=collection_name):
                     recipe_collection_qs = get_recipe_collection_by_sort_order(collection_name)
                     expected_recipe_ids_order = list(range(1, 5))
                     
@@ -546,22 +577,33 @@ class GetRecipeCollectionBySortOrderTest(TestCase):
                         expected_recipe_ids_order
                         )
 
+    def test_get_recipe_collection_by_sort_order_joins_recipe(self):
+        recipe_collection_qs = get_recipe_collection_by_sort_order("history")
+
+        with self.assertNumQueries(1):
+            titles = [entry.recipe.title for entry in recipe_collection_qs]
+
+        self.assertEqual(len(titles), 4)
+
 class FilterRecipeCollectionByMemberTest(TestCase):
-    def setUp(self):
-        self.logged_user = Member.objects.create(username="test_user", password="password")
-        for ind in range(1, 3):
-            recipe = Recipe.objects.create(title=f"recette_{ind}", category="plat")
-            RecipeCollectionEntry.objects.create(collection_name="album", member=self.logged_user, recipe=recipe)
-        
-        self.friend_1  = Member.objects.create(username=f"friend_1", password="password")
-        self.friend_2 = Member.objects.create(username=f"friend_2", password="password")
-        for ind_recette in range(11, 13):
-            recipe = Recipe.objects.create(title=f"recette_{ind_recette}", category="plat")
-            for friend in [self.friend_1, self.friend_2]:
-                self.logged_user.friends.add(friend)
-                RecipeCollectionEntry.objects.create(collection_name="album", member=friend, recipe=recipe)
+    @classmethod
+    def setUpTestData(cls):
+        cls.logged_user, cls.friend_1, cls.friend_2 = Member.objects.bulk_create([
+            Member(username=username, password="password") for username in ["test_user", "friend_1", "friend_2"]
+        ])
+        cls.logged_user.friends.add(cls.friend_1, cls.friend_2)
+        user_recipes = Recipe.objects.bulk_create([Recipe(title=f"recette_{ind}", category="plat") for ind in range(1, 3)])
+        friend_recipes = Recipe.objects.bulk_create([Recipe(title=f"recette_{ind}", category="plat") for ind in range(11, 13)])
+        RecipeCollectionEntry.objects.bulk_create(
+            [RecipeCollectionEntry(collection_name="album", member=cls.logged_user, recipe=recipe) for recipe in user_recipes]
+            + [
+                RecipeCollectionEntry(collection_name="album", member=friend, recipe=recipe)
+                for recipe in friend_recipes
+                for friend in [cls.friend_1, cls.friend_2]
+            ]
+        )
         
-        self.initial_recipe_collection_qs = RecipeCollectionEntry.objects.all()
+        cls.initial_recipe_collection_qs = RecipeCollectionEntry.objects.all()
     
     def test_filter_recipe_collection_by_member_raises_exception_when_friends_and_no_logged_user(self):
         params = {"member": "friends", "logged_user": None}
@@ -600,27 +642,28 @@ class FilterRecipeCollectionByMemberTest(TestCase):
         self._test_filter_recipe_collection_by_member(params, expected_recipe_collection_qs)
 
 class GetFilteredRecipeCollectionQsTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
         ingredient = Ingredient.objects.create(name="carotte")
         recipe_ingredient = RecipeIngredient.objects.create(ingredient=ingredient, quantity=1, unit="u")
-        self.recipe1 = Recipe.objects.create(title="Recette 1", category="plat")
-        self.recipe2 = Recipe.objects.create(title="Recette 2", category="dessert")
-        self.recipe3 = Recipe.objects.create(title="Recette 3", category="dessert")
-        self.recipe2.recipe_ingredient.add(recipe_ingredient)
-        self.recipe3.recipe_ingredient.add(recipe_ingredient)
+        cls.recipe1 = Recipe.objects.create(title="Recette 1", category="plat")
+        cls.recipe2 = Recipe.objects.create(title="Recette 2", category="dessert")
+        cls.recipe3 = Recipe.objects.create(title="Recette 3", category="dessert")
+        cls.recipe2.recipe_ingredient.add(recipe_ingredient)
+        cls.recipe3.recipe_ingredient.add(recipe_ingredient)
 
         for collection_name, _ in RecipeCollectionEntry.MODEL_COLLECTION_CHOICES:
             RecipeCollectionEntry.objects.create(
                 collection_name=collection_name,
-                member=self.member,
-                recipe=self.recipe2,
+                member=cls.member,
+                recipe=cls.recipe2,
                 saving_date="2025-02-01"
             )
             RecipeCollectionEntry.objects.create(
                 collection_name=collection_name,
-                member=self.member,
-                recipe=self.recipe3,
+                member=cls.member,
+                recipe=cls.recipe3,
                 saving_date="2025-02-02"
             )
     
@@ -686,23 +729,24 @@ class GetFilteredRecipeCollectionQsTest(TestCase):
                             self._test_get_filtered_recipe_collection_qs(partial_form_data, collection_name, form_class)
 
 class GetFilteredRecipeQsTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
         ingredient = Ingredient.objects.create(name="carotte")
         recipe_ingredient = RecipeIngredient.objects.create(ingredient=ingredient, quantity=1, unit="u")
-        self.recipe1 = Recipe.objects.create(title="Recette 1", category="plat")
-        self.recipe2 = Recipe.objects.create(title="Recette 2", category="dessert")
-        self.recipe3 = Recipe.objects.create(title="Recette 3", category="dessert")
-        self.recipe2.recipe_ingredient.add(recipe_ingredient)
-        self.recipe3.recipe_ingredient.add(recipe_ingredient)
+        cls.recipe1 = Recipe.objects.create(title="Recette 1", category="plat")
+        cls.recipe2 = Recipe.objects.create(title="Recette 2", category="dessert")
+        cls.recipe3 = Recipe.objects.create(title="Recette 3", category="dessert")
+        cls.recipe2.recipe_ingredient.add(recipe_ingredient)
+        cls.recipe3.recipe_ingredient.add(recipe_ingredient)
         RecipeCollectionEntry.objects.create(
-            member=self.member,
-            recipe=self.recipe2,
+            member=cls.member,
+            recipe=cls.recipe2,
             saving_date="2025-02-01"
         )
         RecipeCollectionEntry.objects.create(
-            member=self.member,
-            recipe=self.recipe3,
+            member=cls.member,
+            recipe=cls.recipe3,
             saving_date="2025-02-02"
         )
 
@@ -758,11 +802,12 @@ class GetFilteredRecipeQsTest(TestCase):
                 self._test_get_filtered_recipe_qs(partial_form_data, member=None)
 
 class HandleSearchRecipeRequestTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
-        for ind in range(1, 3):
-            Recipe.objects.create(title=f"recette plat_{ind}", category="plat")
-        self.factory = RequestFactory()
+    factory = RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
+        Recipe.objects.bulk_create([Recipe(title=f"recette plat_{ind}", category="plat") for ind in range(1, 3)])
 
     def test_handle_search_recipe_request_form_invalid(self):        
         request = self.factory.get("/", {"category": "unvalid_category"})
@@ -811,11 +856,12 @@ class HandleSearchRecipeRequestTest(TestCase):
         self.assertEqual(recipe_qs.count(), 0)
 
 class HandleShowRecipeCollectionRequestTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
-        for ind in range(1, 3):
-            Recipe.objects.create(title=f"recette plat_{ind}", category="plat")
-        self.factory = RequestFactory()
+    factory = RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
+        Recipe.objects.bulk_create([Recipe(title=f"recette plat_{ind}", category="plat") for ind in range(1, 3)])
 
     def test_handle_show_recipe_collection_request_form_invalid(self):        
         request = self.factory.post("/", {"collection_name": "unvalid_collection_name"})
@@ -837,8 +883,7 @@ class HandleShowRecipeCollectionRequestTest(TestCase):
         self.assertEqual(recipe_collection_qs, "mock_get_filtered_recipe_collection_qs")
 
 class CheckRequestValidityTest(TestCase):
-    def setUp(self):
-        self.factory = RequestFactory()
+    factory = RequestFactory()
 
     def _test_check_request_validity_status_code_400_expected(self, params, expected_message):
         request = self.factory.post("/", params)
@@ -909,10 +954,12 @@ class CheckRequestValidityTest(TestCase):
             self.assertIn(collection_name, dict(RecipeCollectionEntry.MODEL_COLLECTION_CHOICES).keys())
 
 class UpdateCollectionTest(TestCase):
-    def setUp(self):
-        self.member = Member.objects.create(username="test_user", password="password")
-        self.recipe = Recipe.objects.create(title="recette test", category="plat")
-        self.factory = RequestFactory()
+    factory = RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = Member.objects.create(username="test_user", password="password")
+        cls.recipe = Recipe.objects.create(title="recette test", category="plat")
     
     def _test_update_collection(self, action, collection_name, mocked_request_validity_json, expected_message, expected_status):
         with patch.object(utils, path.CHECK_REQUEST_VALIDITY) as mock_check_request_validity:
@@ -929,6 +976,28 @@ class UpdateCollectionTest(TestCase):
             self.assertEqual(json_response.status_code, expected_status)
             self.assertIn(expected_message, response_data["message"])
 
+    def test_update_collection_add_with_entry_created_concurrently(self):
+        real_get = QuerySet.get
+        concurrent_entries = []
+
+        def get_before_concurrent_insert(queryset, *args, **kwargs):
+            if not concurrent_entries:
+                concurrent_entries.extend(RecipeCollectionEntry.objects.bulk_create([
+                    RecipeCollectionEntry(collection_name="album", member=self.member, recipe=self.recipe)
+                ]))
+                raise RecipeCollectionEntry.DoesNotExist
+            return real_get(queryset, *args, **kwargs)
+
+        with patch.object(QuerySet, "get", autospec=True, side_effect=get_before_concurrent_insert):
+            self._test_update_collection(
+                action="add",
+                collection_name="album",
+                mocked_request_validity_json=None,
+                expected_message="La recette fait déjà partie de votre Album de recettes.",
+                expected_status=200
+            )
+        self.assertEqual(RecipeCollectionEntry.objects.filter(collection_name="album").count(), 1)
+
     def test_update_collection_without_collection_name(self):
         mocked_request_validity_json = JsonResponse({"message": "Nom de la collection manquant."}, status=400)
         for action in ["add", "remove"]:
@@ -48,6 +48,26 @@ class CheckTitleTest(TestCase):
             expected_message_list=["Ce titre de recette est déjà utilisé!"]
             )
 
+    @patch.object(ut, path.VALIDATE_TITLE)
+    def test_check_title_already_exists_in_another_case(self, mock_validate_title):
+        mock_validate_title.return_value = None
+        Recipe.objects.create(title="recette test")
+
+        self._test_check_title_return_status_code_200(
+            params={"title": "Recette Test"},
+            expected_message_list=["Ce titre de recette est déjà utilisé!"]
+            )
+
+    @patch.object(ut, path.VALIDATE_TITLE)
+    def test_check_title_already_exists_with_accented_letters_in_another_case(self, mock_validate_title):
+        mock_validate_title.return_value = None
+        Recipe.objects.create(title="Éclair au café")
+
+        self._test_check_title_return_status_code_200(
+            params={"title": "éclair au CAFÉ"},
+            expected_message_list=["Ce titre de recette est déjà utilisé!"]
+            )
+
     @patch.object(ut, path.VALIDATE_TITLE)
     def test_check_title_with_title_too_long(self, mock_validate_title):
         mock_validate_title.return_value = ["Titre trop long"]
@@ -7,16 +7,17 @@ from django.test import TestCase
 from django.urls import reverse
 from recipe_journal.forms import AddFriendForm, AddRecipeToCollectionsForm, RecipeCombinedForm, RecipeIngredientForm
 from recipe_journal.forms import RegistrationForm, ShowRecipeCollectionForm, SearchRecipeForm
-from recipe_journal.models import Member, Recipe, RecipeCollectionEntry
+from recipe_journal.models import Ingredient, Member, Recipe, RecipeCollectionEntry, RecipeIngredient
 from recipe_journal.tests.test_config.mock_function_paths import MockFunctionPathManager
 import recipe_journal.utils.utils as ut
 from unittest.mock import patch
 
 path = MockFunctionPathManager()
+HASHED_PASSWORD = make_password("password")
 
 class LoginTest(TestCase):
     def setUp(self):
-        Member.objects.create(username="testuser", password=make_password("password"))
+        Member.objects.create(username="testuser", password=HASHED_PASSWORD)
 
     def test_login_form_valid(self):
         response = self.client.post(reverse("login"), {"username": "testuser", "password": "password"})
@@ -45,7 +46,7 @@ class LoginTest(TestCase):
 
 class LogoutTest(TestCase):
     def setUp(self):
-        Member.objects.create(username="testuser", password=make_password("password"))
+        Member.objects.create(username="testuser", password=HASHED_PASSWORD)
 
     def test_logout_without_logged_user(self):
         response = self.client.get(reverse("logout"))
@@ -66,7 +67,7 @@ class LogoutTest(TestCase):
 
 class RegisterTest(TestCase):
     def setUp(self):
-        Member.objects.create(username="testuser", password=make_password("password"))
+        Member.objects.create(username="testuser", password=HASHED_PASSWORD)
 
     def test_register_method_get(self):
         response = self.client.get(reverse("register"), {"username": "new_username", "password": "password"})
@@ -100,8 +101,8 @@ class RegisterTest(TestCase):
 
 class ModifyProfileTest(TestCase):
     def setUp(self):
-        Member.objects.create(username="testuser", password=make_password("password"))
-        Member.objects.create(username="existing_user", password=make_password("password"))
+        Member.objects.create(username="testuser", password=HASHED_PASSWORD)
+        Member.objects.create(username="existing_user", password=HASHED_PASSWORD)
     
     def test_modify_profile_without_logged_user(self):
         response = self.client.post(reverse("modify_profile"))
@@ -245,7 +246,7 @@ class WelcomeTest(TestCase):
 
 class AddRecipeTest(TestCase):
     def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password"))
+        self.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
     
     @patch.object(ut, path.GET_LOGGED_USER)
     def test_add_recipe_user_without_logged_user(self, mock_get_logged_user):
@@ -379,11 +380,24 @@ class ShowRecipeTest(TestCase):
         self.assertIn("recipe", context)
         self.assertEqual(context["recipe"], Recipe.objects.get(id=1))
         self.assertEqual(context["MEDIA_URL"], settings.MEDIA_URL)
+
+    @patch.object(ut, path.GET_LOGGED_USER)
+    def test_show_recipe_loads_ingredients_in_one_query(self, mock_get_logged_user):
+        mock_get_logged_user.return_value = None
+        recipe = Recipe.objects.get(id=1)
+        for ind in range(3):
+            ingredient = Ingredient.objects.create(name=f"ingrédient {ind}")
+            recipe.recipe_ingredient.add(RecipeIngredient.objects.create(ingredient=ingredient, quantity=1, unit="g"))
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("show_recipe"), {"recipe-id": 1})
+
+        self.assertContains(response, "ingrédient 2")
         
 class ShowFriendsTest(TestCase):
     def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password"))
-        self.friend = Member.objects.create(username="friend", password=make_password("password"))
+        self.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
+        self.friend = Member.objects.create(username="friend", password=HASHED_PASSWORD)
         self.client.post(reverse("login"), {"username":"testuser", "password":"password"})
 
     def side_effect_add_friend(self, request, logged_user):
@@ -505,7 +519,7 @@ class SearchRecipeTest(TestCase):
 
 class ShowRecipeCollectionTest(TestCase):
     def setUp(self):
-        self.member = Member.objects.create(username="testuser", password=make_password("password"))
+        self.member = Member.objects.create(username="testuser", password=HASHED_PASSWORD)
         self.client.post(reverse("login"), {"username":"testuser", "password":"password"})
 
     @patch.object(ut, path.GET_LOGGED_USER)
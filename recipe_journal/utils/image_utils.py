@@ -8,6 +8,8 @@ def compress_image(image, quality=50):
     """
     Compresses an image by reducing its quality and returns a new File object.
 
+    The image is re-encoded in memory with Pillow's optimized encoding, without any temporary file.
+
     Parameters:
     - image (File): The image to compress.
     - quality (int, optional): The compression quality level (between 1 and 100).
@@ -16,9 +18,9 @@ def compress_image(image, quality=50):
     - File: A new compressed image as a File object.
     """
     img = Image.open(image)
-    rgb_img = img.convert("RGB")
+    rgb_img = img if img.mode == "RGB" else img.convert("RGB")
     img_io = BytesIO()
-    rgb_img.save(img_io, format=img.format, quality=quality)
+    rgb_img.save(img_io, format=img.format, quality=quality, optimize=True)
 
     new_image = File(img_io, name=image.name)
     return new_image
\ No newline at end of file
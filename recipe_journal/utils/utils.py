@@ -9,9 +9,10 @@ from django.contrib import messages
 from django.db.models import Min
 from django.forms import ValidationError
 from django.http import JsonResponse
+from functools import lru_cache
 from recipe_journal.forms import  AddFriendForm, RecipeIngredientForm, RecipeCombinedForm
 from recipe_journal.forms import ShowRecipeCollectionForm, AddRecipeToCollectionsForm, SearchRecipeForm
-from recipe_journal.models import Member, Recipe, RecipeCollectionEntry
+from recipe_journal.models import Member, Recipe, RecipeCollectionEntry, RecipeIngredient
 import random as rd
 import spacy
 import time
@@ -70,8 +71,8 @@ def get_top_and_thumbnail_recipes(recipe_ids_list, top_recipe_nb):
         - QuerySet: `top_recipe_qs` with the first `top_recipe_nb` recipes.
         - QuerySet: `thumbnail_recipe_qs` with the remaining recipes.
     """
-    top_recipe_qs = Recipe.objects.filter(id__in=recipe_ids_list[:top_recipe_nb])
-    thumbnail_recipe_qs = Recipe.objects.filter(id__in=recipe_ids_list[top_recipe_nb:])
+    top_recipe_qs = Recipe.objects.filter(id__in=recipe_ids_list[:top_recipe_nb]).defer("content")
+    thumbnail_recipe_qs = Recipe.objects.filter(id__in=recipe_ids_list[top_recipe_nb:]).defer("content")
     
     return top_recipe_qs, thumbnail_recipe_qs
 
@@ -149,8 +150,7 @@ def initialize_combined_form(combined_form_class, request):
     Returns:
     - Form: The initialized combined form instance.
     """
-    combined_form = combined_form_class()
-    form_fields = list(combined_form.main_form.base_fields) + list(combined_form.secondary_form.base_fields)
+    form_fields = combined_form_class.get_base_field_names()
 
     if any(field in request.POST for field in form_fields):
         return combined_form_class(request.POST, request.FILES)
@@ -217,10 +217,15 @@ def save_recipe_and_ingredients(recipe_form, recipe_ingredient_form_list):
     - Recipe: The saved recipe object.
     """
     recipe = recipe_form.save()
-
-    for recipe_ingredient_form in recipe_ingredient_form_list:
-        recipe_ingredient = recipe_ingredient_form.save()
-        recipe.recipe_ingredient.add(recipe_ingredient)
+    ingredients = RecipeIngredientForm.resolve_ingredients(
+        recipe_ingredient_form.cleaned_data["name"] for recipe_ingredient_form in recipe_ingredient_form_list
+    )
+    recipe_ingredient_list = RecipeIngredient.objects.bulk_create([
+        recipe_ingredient_form.save(commit=False, ingredients=ingredients)
+        for recipe_ingredient_form in recipe_ingredient_form_list
+    ])
+
+    recipe.recipe_ingredient.add(*recipe_ingredient_list)
     return recipe
 
 def create_recipe_collection_entry(
@@ -294,10 +299,9 @@ def handle_add_friend_request(request, logged_user):
     
     if form.is_valid():
         new_friend_username = form.cleaned_data["username_to_add"]
-        new_friend = Member.objects.get(username=new_friend_username)
+        new_friend = form.get_friend()
 
         logged_user.friends.add(new_friend)
-        logged_user.save()
         messages.success(request, f"Nous avons ajouté {new_friend_username} à votre liste d'amis !")
        
     return form
@@ -327,10 +331,13 @@ def handle_remove_friend_request(request, logged_user):
     else:
         messages.error(request, "Aucun utilisateur à supprimer.")
        
+@lru_cache(maxsize=1024)
 def normalize_ingredient(ingredient_name):
     """
     Normalizes an ingredient name by lemmatizing its tokens.
 
+    Results are cached per name, as the same ingredients are searched for repeatedly.
+
     Parameters:
     - ingredient_name (str or None): The name of the ingredient to normalize.
 
@@ -369,14 +376,18 @@ def get_recipe_collection_by_sort_order(collection_name):
     Returns:
     - QuerySet: A queryset of RecipeCollectionEntry objects, ordered by saving date for "history",
       or by recipe title for other collections, or all entries if no collection is specified.
+      The related recipe is joined so that listing the entries does not query it row by row,
+      without its content which is only displayed on the recipe page.
     """
+    entries_qs = RecipeCollectionEntry.objects.select_related("recipe").defer("recipe__content")
+
     if collection_name == "history":
-        return RecipeCollectionEntry.objects.filter(collection_name=collection_name).order_by("-saving_date")
+        return entries_qs.filter(collection_name=collection_name).order_by("-saving_date")
     
     if collection_name:
-        return RecipeCollectionEntry.objects.filter(collection_name=collection_name).order_by("recipe__title")
+        return entries_qs.filter(collection_name=collection_name).order_by("recipe__title")
     
-    return RecipeCollectionEntry.objects.all().order_by("recipe__title")
+    return entries_qs.order_by("recipe__title")
 
 def filter_recipe_collection_by_member(recipe_collection_qs, member=None, logged_user=None):
     """
@@ -455,7 +466,7 @@ def get_filtered_recipe_qs(form, logged_user):
     - logged_user (Member): The currently logged-in user.
 
     Returns:
-    - QuerySet: A filtered queryset of recipes based on the form data.
+    - QuerySet: A filtered queryset of recipes based on the form data, without their content.
     """
     title = form.cleaned_data.get("title")
     category = form.cleaned_data.get("category")
@@ -482,7 +493,7 @@ def get_filtered_recipe_qs(form, logged_user):
         if ingredient_name:
             recipe_qs = recipe_qs.filter(recipe_ingredient__ingredient__name__icontains=ingredient_name)
 
-    return recipe_qs.order_by("title")
+    return recipe_qs.defer("content").order_by("title")
 
 def handle_search_recipe_request(request, logged_user):
     """
@@ -508,7 +519,7 @@ def handle_search_recipe_request(request, logged_user):
         else:
             return form, RecipeCollectionEntry.objects.none(), get_filtered_recipe_qs(form, logged_user=logged_user)
    
-    return form, RecipeCollectionEntry.objects.none(), Recipe.objects.all().order_by("title")
+    return form, RecipeCollectionEntry.objects.none(), Recipe.objects.defer("content").order_by("title")
 
 def handle_show_recipe_collection_request(request):
     """
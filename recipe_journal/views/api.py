@@ -3,6 +3,7 @@ Module containing the views of the application handling backend interaction with
 
 Each view interacts with the backend models and returns responses to the frontend in JSON format.
 """
+from django.forms import ValidationError
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404
@@ -28,7 +29,7 @@ def check_title(request):
     title = request.GET.get("title")
     error_list = ut.validate_title(title)
     
-    if not error_list and Recipe.objects.filter(title=title).exists():
+    if not error_list and Recipe.objects.filter(casefolded_title=title.casefold()).exists():
         error_list = ["Ce titre de recette est déjà utilisé!"]
     
     if error_list:
@@ -121,8 +122,13 @@ def add_recipe_history(request):
     form = CreateRecipeHistoryForm(request.POST)
 
     if form.is_valid():
-        form.save()
-        return JsonResponse({"success": True})
+        try:
+            form.save()
+        except ValidationError:
+            # The entry was saved by a concurrent request, the error is already attached to the form.
+            pass
+        else:
+            return JsonResponse({"success": True})
     
     return JsonResponse({"success": False, "errors": form.errors})
     
@@ -2,12 +2,14 @@
 Module managing the main views of the application, which are accessible through regular web pages.
 """
 from django.conf import settings
+from django.db.models import Prefetch
+from django.forms import ValidationError
 from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_http_methods
 from recipe_journal.forms import LoginForm, AddFriendForm, AddRecipeToCollectionsForm, ModifyProfileForm
 from recipe_journal.forms import RecipeCombinedForm, RecipeIngredientForm, RegistrationForm, SearchRecipeForm
-from recipe_journal.models import Member, Recipe, RecipeCollectionEntry
+from recipe_journal.models import Recipe, RecipeCollectionEntry, RecipeIngredient
 import recipe_journal.utils.utils as ut
 
 def login(request):
@@ -17,8 +19,7 @@ def login(request):
     if request.method == "POST":
         form = LoginForm(request.POST)
         if form.is_valid():
-            username = form.cleaned_data["username"]
-            logged_user = Member.objects.get(username=username)
+            logged_user = form.get_user()
             request.session["logged_user_id"] = logged_user.id
             return redirect("/welcome")
         else:
@@ -42,10 +43,14 @@ def register(request):
     if request.method == "POST":
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            form.save()
-            return redirect("/login")
-        else:
-            return render(request, "register.html", {"form": form})
+            try:
+                form.save()
+            except ValidationError:
+                # The username was taken since validation, the error is already attached to the form.
+                pass
+            else:
+                return redirect("/login")
+        return render(request, "register.html", {"form": form})
     else:
         form = RegistrationForm()
         return render(request, "register.html", {"form": form})
@@ -59,10 +64,14 @@ def modify_profile(request):
     if request.method == "POST" and len(request.POST)>0:
         form = ModifyProfileForm(request.POST, instance=logged_user, logged_user=logged_user)
         if form.is_valid():
-            form.save()
-            return redirect("/login")
-        else:
-            return render(request, "modify_profile.html", {"form": form, "logged_user": logged_user})
+            try:
+                form.save()
+            except ValidationError:
+                # The username was taken since validation, the error is already attached to the form.
+                pass
+            else:
+                return redirect("/login")
+        return render(request, "modify_profile.html", {"form": form, "logged_user": logged_user})
     else:
         form = ModifyProfileForm(instance=logged_user, logged_user=logged_user)
     return render(request, "modify_profile.html", {"form": form, "logged_user": logged_user})
@@ -105,9 +114,14 @@ def add_recipe(request):
         recipe_form, recipe_ingredient_form_list, add_recipe_to_collection_form = ut.prepare_recipe_forms(request)
 
         if ut.are_forms_valid(*recipe_ingredient_form_list, recipe_form, add_recipe_to_collection_form):
-            recipe = ut.save_recipe_and_ingredients(recipe_form, recipe_ingredient_form_list)
-            ut.add_recipe_to_collections(add_recipe_to_collection_form, logged_user, recipe, request)
-            return redirect("/show-confirmation-page")
+            try:
+                recipe = ut.save_recipe_and_ingredients(recipe_form, recipe_ingredient_form_list)
+            except ValidationError:
+                # The title was taken since validation, the error is already attached to recipe_form.
+                pass
+            else:
+                ut.add_recipe_to_collections(add_recipe_to_collection_form, logged_user, recipe, request)
+                return redirect("/show-confirmation-page")
             
     context = {
         "logged_user": logged_user,
@@ -137,7 +151,10 @@ def show_recipe(request):
     if not recipe_id or not recipe_id.isdigit():
         return redirect("/welcome")
     
-    recipe = get_object_or_404(Recipe, id=int(recipe_id))
+    recipe_qs = Recipe.objects.prefetch_related(
+        Prefetch("recipe_ingredient", queryset=RecipeIngredient.objects.select_related("ingredient"))
+        )
+    recipe = get_object_or_404(recipe_qs, id=int(recipe_id))
         
     context = {
         "logged_user": logged_user,
@@ -182,7 +199,7 @@ def search_recipe(request):
     else:
         form = SearchRecipeForm(logged_user=logged_user)
         recipe_collection_qs = RecipeCollectionEntry.objects.none()
-        recipe_qs = Recipe.objects.all().order_by("title")
+        recipe_qs = Recipe.objects.defer("content").order_by("title")
        
     form_html = render_to_string("partials/form_search_recipe.html", {"form": form}, request=request)
     collection_name = getattr(form, "cleaned_data", {}).get("collection_name", None)